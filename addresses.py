@@ -0,0 +1,166 @@
+import re
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+# Сокращения адресных элементов: полная форма и варианты записи -> каноническая форма
+ABBREVIATIONS = {
+    "г": "г", "город": "г",
+    "ул": "ул", "улица": "ул",
+    "пр-кт": "пр-кт", "пр-т": "пр-кт", "просп": "пр-кт", "проспект": "пр-кт",
+    "б-р": "б-р", "бул": "б-р", "бульвар": "б-р",
+    "пер": "пер", "переулок": "пер",
+    "пр-д": "пр-д", "проезд": "пр-д",
+    "ш": "ш", "шоссе": "ш",
+    "пл": "пл", "площадь": "пл",
+    "наб": "наб", "набережная": "наб",
+    "д": "д", "дом": "д",
+    "корп": "корп", "корпус": "корп", "к": "корп",
+    "стр": "стр", "строение": "стр",
+    "лит": "лит", "литера": "лит",
+}
+
+_PUNCTUATION = re.compile(r"[.,;:\"'«»()\[\]№#]+")
+# Звездочка или точка в конце адреса в справочнике обозначают отдельное строение по тому же адресу
+# ("д.8" — жилой дом, "д.8*" — другое строение), поэтому это часть ключа, а не пунктуация
+_BUILDING_MARKER = re.compile(r"[.*]+$")
+_LETTER_DIGIT = re.compile(r"(?<=[а-яa-z])(?=\d)")
+_SPACES = re.compile(r"\s+")
+_HOUSE_LETTER = re.compile(r"(?<=\d) (?=[а-я](?: |$))")
+_DIGITS = re.compile(r"\d+")
+
+
+def canonical_address(address):
+    # Приведение адреса к каноническому виду: регистр, ё→е, пунктуация, сокращения
+    if not isinstance(address, str):
+        return ""
+    text = address.strip().lower().replace("ё", "е")
+    marker = _BUILDING_MARKER.search(text)
+    marker = marker.group() if marker else ""
+    text = _PUNCTUATION.sub(" ", text[:len(text) - len(marker)])
+    text = _LETTER_DIGIT.sub(" ", text)
+    tokens = [ABBREVIATIONS.get(token, token) for token in text.split()]
+    # "д 2 а" и "д 2а" — один и тот же дом
+    key = _HOUSE_LETTER.sub("", " ".join(tokens))
+    return f"{key} {marker}" if key and marker else key
+
+
+def exact_address(address):
+    # Ключ точного сопоставления, как в исходном объединении: без пробелов по краям, в нижнем регистре
+    return address.strip().lower() if isinstance(address, str) else ""
+
+
+def canonical_addresses(series):
+    # Канонизация только уникальных значений с раскладкой обратно по кодам
+    codes, uniques = pd.factorize(series)
+    canonical = np.array([canonical_address(value) for value in uniques], dtype=object)
+    result = np.full(len(series), "", dtype=object)
+    result[codes >= 0] = canonical[codes[codes >= 0]]
+    return pd.Series(result, index=series.index)
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AddressIndex:
+    # Три уровня сопоставления: точный адрес (strip + lower), канонический адрес и нечеткий поиск
+    # по триграммам. Канонический ключ, общий для нескольких разных адресов справочника, неоднозначен:
+    # по нему не сопоставляется, а сами совпадения перечислены в collisions
+
+    def __init__(self, reference_df, address_col="Адрес объекта", fuzzy_threshold=0.8):
+        reference_df = reference_df.reset_index(drop=True)
+        exact_keys = pd.Series([exact_address(value) for value in reference_df[address_col]], dtype=object)
+        # При повторах точного адреса в справочнике берется первая запись
+        first = (~exact_keys.duplicated() & (exact_keys != "")).to_numpy()
+        addresses = reference_df.loc[first, address_col].reset_index(drop=True)
+        self.attributes = reference_df.loc[first].drop(columns=[address_col]).reset_index(drop=True)
+        self.exact_positions = {key: position for position, key in enumerate(exact_keys[first])}
+        self.fuzzy_threshold = fuzzy_threshold
+
+        groups = defaultdict(list)
+        for position, key in enumerate(canonical_addresses(addresses)):
+            if key:
+                groups[key].append(position)
+        self.positions = {key: positions[0] for key, positions in groups.items() if len(positions) == 1}
+        self.ambiguous = {key for key, positions in groups.items() if len(positions) > 1}
+        self.collisions = pd.DataFrame(
+            [{"Каноническая форма": key, "Адреса справочника": "; ".join(addresses.iloc[groups[key]])}
+             for key in sorted(self.ambiguous)],
+            columns=["Каноническая форма", "Адреса справочника"],
+        )
+
+        # Нечеткий поиск — только по однозначным каноническим ключам
+        self.keys = list(self.positions)
+        self._key_positions = np.array([self.positions[key] for key in self.keys], dtype=np.int64)
+        self._trigram_index = defaultdict(list)
+        self._trigram_counts = np.zeros(len(self.keys), dtype=np.int32)
+        self._house_numbers = []
+        for position, key in enumerate(self.keys):
+            grams = _trigrams(key)
+            self._trigram_counts[position] = len(grams)
+            for gram in grams:
+                self._trigram_index[gram].append(position)
+            self._house_numbers.append(_DIGITS.findall(key))
+        self._trigram_index = {
+            gram: np.array(postings, dtype=np.int32) for gram, postings in self._trigram_index.items()
+        }
+
+    def fuzzy_lookup(self, key):
+        # Кандидаты по общим триграммам, сходство по коэффициенту Дайса.
+        # Номера домов и корпусов должны совпадать точно, иначе это другой дом.
+        grams = _trigrams(key)
+        postings = [self._trigram_index[gram] for gram in grams if gram in self._trigram_index]
+        if not postings:
+            return -1
+        candidates, shared = np.unique(np.concatenate(postings), return_counts=True)
+        scores = 2 * shared / (len(grams) + self._trigram_counts[candidates])
+        house_numbers = _DIGITS.findall(key)
+        for order in np.argsort(-scores):
+            if scores[order] < self.fuzzy_threshold:
+                break
+            candidate = candidates[order]
+            if self._house_numbers[candidate] == house_numbers:
+                return int(self._key_positions[candidate])
+        return -1
+
+    def lookup(self, addresses, fuzzy=True):
+        # Позиции в справочнике (-1 — не найдено) и способ сопоставления для каждой строки
+        codes, uniques = pd.factorize(addresses)
+        unique_positions = np.full(len(uniques), -1, dtype=np.int64)
+        unique_how = np.full(len(uniques), "нет", dtype=object)
+        for i, value in enumerate(uniques):
+            position = self.exact_positions.get(exact_address(value), -1)
+            if position >= 0:
+                unique_positions[i], unique_how[i] = position, "точное"
+                continue
+            key = canonical_address(value)
+            if key in self.ambiguous:
+                unique_how[i] = "неоднозначное"
+            elif key in self.positions:
+                unique_positions[i], unique_how[i] = self.positions[key], "каноническое"
+            elif fuzzy and key:
+                unique_positions[i] = self.fuzzy_lookup(key)
+                if unique_positions[i] >= 0:
+                    unique_how[i] = "нечеткое"
+
+        positions = np.full(len(addresses), -1, dtype=np.int64)
+        how = np.full(len(addresses), "нет", dtype=object)
+        valid = codes >= 0
+        positions[valid] = unique_positions[codes[valid]]
+        how[valid] = unique_how[codes[valid]]
+        return positions, how
+
+    def join(self, df, address_col="Адрес объекта", fuzzy=True):
+        # Левое соединение с атрибутами справочника; совпадающие имена колонок получают суффиксы _x/_y, как в pd.merge
+        positions, how = self.lookup(df[address_col], fuzzy=fuzzy)
+        attributes = self.attributes.reindex(positions).reset_index(drop=True)
+        attributes.index = df.index
+        overlap = df.columns.intersection(attributes.columns)
+        left = df.rename(columns={col: f"{col}_x" for col in overlap})
+        right = attributes.rename(columns={col: f"{col}_y" for col in overlap})
+        joined = pd.concat([left, right], axis=1)
+        joined["Сопоставление адреса"] = how
+        return joined
@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+
+from anomalies import RuleSet, HIGH_DEVIATION, LOW_DEVIATION, REPEATED_READING, ZERO_IN_HEATING
+from metrics import (
+    add_specific_consumption,
+    PERCENTILE_PER_AREA,
+    PERCENTILE_PER_FLOOR,
+    SPECIFIC_PER_AREA,
+    SPECIFIC_PER_FLOOR,
+)
+from parsing import contains, map_unique, parse_dates
+from validation import (
+    BAD_COORDINATES,
+    COMMA_IN_METER,
+    NO_AREA,
+    NO_BUILD_DATE,
+    NO_CONSUMPTION,
+    NO_FLOORS,
+    NO_PERIOD,
+    NO_READING_DATE,
+)
+
+# Расчеты вкладок без Streamlit: их вызывают и этапы конвейеров main.py, и пакетный запуск cli.py.
+# Функции не изменяют свои входы — результаты этапов конвейера общие между перезапусками.
+
+ZERO_FLAG = "Аномалия_нулевое_потребление_в_ОП"
+DEVIATION = "Отклонение от среднего в %"
+
+
+# 1 пример: нулевое потребление в отопительный период
+
+def drop_comma_meters(df, quality):
+    # Строки с запятыми в № ОДПУ (несколько счетчиков в одной строке) в анализ не попадают
+    return df[~quality.violations(COMMA_IN_METER)]
+
+
+def flag_zero_consumption(df):
+    df = df.copy()
+    df["Текущее потребление, Гкал"] = df["Текущее потребление, Гкал"].fillna(0)
+    # Тег аномалии нулевого потребления в отопительный период (правило ZERO_IN_HEATING)
+    df[ZERO_FLAG] = RuleSet([ZERO_IN_HEATING]).evaluate(df)[ZERO_IN_HEATING.name]
+    return df
+
+
+# 2 пример: повторяющиеся показания ОДПУ
+
+def duplicate_readings(df, quality):
+    # Даты повторяющихся показаний по каждому ОДПУ и очищенная таблица показаний.
+    # Полные дубликаты по трём ключевым полям удаляются при чтении (dedup.read_unique)
+
+    # Удаление записей без указанной даты текущего показания
+    df = df[~quality.violations(NO_READING_DATE)]
+
+    # Преобразование даты
+    if "Дата текущего показания" in df.columns:
+        df = df.assign(**{"Дата текущего показания": parse_dates(df["Дата текущего показания"])})
+
+    # Сортировка по № ОДПУ и дате
+    df_sorted = df.sort_values(by=["№ ОДПУ", "Дата текущего показания"])
+
+    # Показания, значение которых повторяется у того же ОДПУ (правило REPEATED_READING)
+    repeated = RuleSet([REPEATED_READING]).evaluate(df_sorted)[REPEATED_READING.name]
+    duplicate_rows = df_sorted[repeated.to_numpy()].copy()
+
+    # Создаем поле "дата" в формате DD-MM-YYYY
+    duplicate_rows["дата"] = map_unique(
+        duplicate_rows["Дата текущего показания"], lambda dates: dates.strftime("%d-%m-%Y")
+    )
+
+    # Группировка по № ОДПУ и сбор всех дат с дубликатами потребления;
+    # строки уже отсортированы по ОДПУ и дате, поэтому списки дат упорядочены
+    grouped_dates = (
+        duplicate_rows
+        .groupby("№ ОДПУ")["дата"]
+        .apply(list)
+        .reset_index()
+        .rename(columns={"дата": "даты"})
+    )
+
+    # Адрес, широта и долгота каждого ОДПУ
+    address_info = (
+        df[["№ ОДПУ", "Адрес объекта", "Широта", "Долгота", "Тип объекта"]]
+        .drop_duplicates(subset=["№ ОДПУ"])
+        .set_index("№ ОДПУ")
+    )
+    grouped_dates = grouped_dates.merge(address_info, left_on="№ ОДПУ", right_index=True, how="left")
+
+    return grouped_dates, df
+
+
+# 3 пример: потребление и температура наружного воздуха
+
+def merge_temperature(usage_df, temp_df):
+    # Показание относится к предыдущему месяцу: дата сдвигается на месяц и сопоставляется с температурой
+    usage_df = usage_df.assign(**{"Дата текущего показания": map_unique(
+        usage_df["Дата текущего показания"],
+        lambda dates: (pd.to_datetime(dates, errors="coerce") - pd.DateOffset(months=1)).strftime("%m-%Y")
+    )})
+    usage_df = usage_df.rename(columns={"Дата текущего показания": "Дата_Показания"})
+    temp_df = temp_df.rename(columns={"Месяц": "Дата_Показания"})
+
+    merged_df = usage_df.merge(temp_df, on="Дата_Показания", how="left")
+    return merged_df[merged_df["Температура"].notna()]
+
+
+def temperature_frame(merged_df):
+    # Показания с температурой и разобранной датой месяца
+    if merged_df.empty:
+        return pd.DataFrame()
+
+    analysis_df = merged_df[
+        ["№ ОДПУ", "Дата_Показания", "Текущее потребление, Гкал", "Температура"]
+    ].dropna()
+    analysis_df["Дата_Показания"] = parse_dates(analysis_df["Дата_Показания"], format="%m-%Y")
+    return analysis_df.dropna(subset=["Дата_Показания"])
+
+
+# 4 пример: отклонение от среднего
+
+def clean_deviation_data(source_df, quality):
+    # Сразу отбрасываем строки с пропусками в ключевых столбцах — маски уже посчитаны проверкой качества
+    incomplete = quality.violations(NO_FLOORS, NO_BUILD_DATE, NO_AREA, NO_PERIOD, NO_CONSUMPTION)
+    df = source_df[~incomplete].copy()
+
+    # Обработка ГВС ИТП
+    df["ГВС ИТП да/нет"] = np.where(contains(df["Вид энерг-а ГВС"], "ГВС-ИТП"), "да", "нет")
+
+    # Преобразование числовых столбцов
+    numeric_cols = ["Этажность объекта", "Общая площадь объекта", "Текущее потребление, Гкал", "Широта", "Долгота"]
+    for col in numeric_cols:
+        df[col] = pd.to_numeric(df[col].astype(str).str.replace(",", "."), errors="coerce")
+
+    # Обработка даты постройки
+    if "Дата постройки" in df.columns:
+        df["Дата постройки"] = parse_dates(df["Дата постройки"]).dt.year
+
+    # Обработка Года и Месяца
+    df["Год"] = pd.to_numeric(df["Год"], errors="coerce").astype("Int64")
+    df["Месяц"] = pd.to_numeric(df["Месяц"], errors="coerce").astype("Int64")
+
+    # Координаты вне допустимого диапазона на карту не попадают
+    df.loc[quality.violations(BAD_COORDINATES)[~incomplete], ["Широта", "Долгота"]] = np.nan
+
+    # Удельное потребление на м² и на этаж с перцентилями в когортах
+    return add_specific_consumption(df)
+
+
+def deviation_table(filtered_df):
+    # Таблица отклонений от среднего по выборке, без итоговой строки
+    result_df = filtered_df[[
+        "Адрес объекта",
+        "Тип объекта",
+        "Категория здания",
+        "Этажность объекта",
+        "Дата постройки",
+        "Общая площадь объекта",
+        "ГВС ИТП да/нет",
+        "Текущее потребление, Гкал",
+        SPECIFIC_PER_AREA,
+        PERCENTILE_PER_AREA,
+        SPECIFIC_PER_FLOOR,
+        PERCENTILE_PER_FLOOR,
+        "Год",
+        "Месяц",
+        "Широта",
+        "Долгота",
+    ]].rename(columns={"Текущее потребление, Гкал": "Потребление, Гкал"})
+
+    if not result_df.empty:
+        average_consumption = result_df["Потребление, Гкал"].mean()
+        if average_consumption != 0:
+            result_df[DEVIATION] = (
+                (result_df["Потребление, Гкал"] - average_consumption) / average_consumption * 100
+            ).round(2)
+        else:
+            result_df[DEVIATION] = 0.0
+    return result_df
+
+
+def deviation_flags(filtered_df):
+    # Правила отклонения от среднего по выборке за один проход
+    return RuleSet([HIGH_DEVIATION, LOW_DEVIATION]).evaluate(filtered_df)
@@ -0,0 +1,174 @@
+import numpy as np
+import pandas as pd
+
+# Декларативные правила аномалий. Условие правила — выражение над колонками, окнами по счетчику
+# и статистиками когорты; все правила набора вычисляются за один проход над общим кэшем
+# промежуточных результатов (колонка, среднее когорты и т. п. считаются один раз на набор).
+#
+#     RuleSet([
+#         Rule("Нулевое потребление в ОП", (num(CONSUMPTION) == 0) & col("Месяц").isin(HEATING_MONTHS)),
+#         Rule("Ниже среднего района", deviation_pct(num(CONSUMPTION), by=["Район"]) < -25),
+#     ]).evaluate(df)
+
+HEATING_MONTHS = [10, 11, 12, 1, 2, 3, 4]
+CONSUMPTION = "Текущее потребление, Гкал"
+METER = "№ ОДПУ"
+
+
+class _Context:
+    def __init__(self, df):
+        self.df = df
+        self.cache = {}
+
+
+class Expr:
+    # Узел выражения; key — структурный ключ, по которому одинаковые подвыражения разных правил
+    # берутся из общего кэша, а не вычисляются заново
+    def __init__(self, key, compute):
+        self.key = key
+        self._compute = compute
+
+    def evaluate(self, ctx):
+        if self.key not in ctx.cache:
+            ctx.cache[self.key] = np.asarray(self._compute(ctx))
+        return ctx.cache[self.key]
+
+    def _binary(self, other, symbol, op):
+        other = _wrap(other)
+        return Expr(f"({self.key} {symbol} {other.key})", lambda ctx: op(self.evaluate(ctx), other.evaluate(ctx)))
+
+    def __eq__(self, other):
+        return self._binary(other, "==", np.equal)
+
+    def __ne__(self, other):
+        return self._binary(other, "!=", np.not_equal)
+
+    def __lt__(self, other):
+        return self._binary(other, "<", np.less)
+
+    def __le__(self, other):
+        return self._binary(other, "<=", np.less_equal)
+
+    def __gt__(self, other):
+        return self._binary(other, ">", np.greater)
+
+    def __ge__(self, other):
+        return self._binary(other, ">=", np.greater_equal)
+
+    def __add__(self, other):
+        return self._binary(other, "+", np.add)
+
+    def __sub__(self, other):
+        return self._binary(other, "-", np.subtract)
+
+    def __mul__(self, other):
+        return self._binary(other, "*", np.multiply)
+
+    def __truediv__(self, other):
+        return self._binary(other, "/", np.divide)
+
+    def __and__(self, other):
+        return self._binary(other, "&", np.logical_and)
+
+    def __or__(self, other):
+        return self._binary(other, "|", np.logical_or)
+
+    def __invert__(self):
+        return Expr(f"~{self.key}", lambda ctx: ~self.evaluate(ctx).astype(bool))
+
+    __hash__ = None
+
+    def isin(self, values):
+        values = list(values)
+        return Expr(f"{self.key}.isin({values!r})", lambda ctx: pd.Series(self.evaluate(ctx)).isin(values).to_numpy())
+
+
+def _wrap(value):
+    return value if isinstance(value, Expr) else Expr(repr(value), lambda ctx: value)
+
+
+def col(name):
+    # Колонка как есть
+    return Expr(f"col({name!r})", lambda ctx: ctx.df[name].to_numpy())
+
+
+def num(name):
+    # Колонка как число; строки с запятой в качестве разделителя тоже разбираются
+    def compute(ctx):
+        series = ctx.df[name]
+        if pd.api.types.is_numeric_dtype(series):
+            return series.to_numpy(dtype="float64", na_value=np.nan)
+        return pd.to_numeric(series.astype(str).str.replace(",", "."), errors="coerce").to_numpy(dtype="float64")
+    return Expr(f"num({name!r})", compute)
+
+
+def repeated_within(expr, by=METER):
+    # Окно по счетчику: значение встречается у того же счетчика больше одного раза
+    def compute(ctx):
+        values = expr.evaluate(ctx)
+        frame = pd.DataFrame({"group": ctx.df[by].to_numpy(), "value": values})
+        return frame.duplicated(keep=False).to_numpy() & ~pd.isna(values)
+    return Expr(f"repeated_within({expr.key}, {by!r})", compute)
+
+
+def cohort_mean(expr, by=()):
+    # Среднее по когорте (без by — по всей выборке), развернутое обратно на строки
+    by = list(by)
+
+    def compute(ctx):
+        values = expr.evaluate(ctx).astype("float64")
+        if not by:
+            mean = np.nanmean(values) if np.isfinite(values).any() else np.nan
+            return np.full(len(values), mean)
+        groups = [ctx.df[col].to_numpy() for col in by]
+        return pd.Series(values).groupby(groups, dropna=False).transform("mean").to_numpy()
+    return Expr(f"cohort_mean({expr.key}, {by!r})", compute)
+
+
+def deviation_pct(expr, by=()):
+    # Отклонение от среднего когорты в процентах; при нулевом среднем отклонение не определено
+    mean = cohort_mean(expr, by)
+    safe_mean = Expr(f"nonzero({mean.key})", lambda ctx: np.where(mean.evaluate(ctx) == 0, np.nan, mean.evaluate(ctx)))
+    return (expr - mean) / safe_mean * 100
+
+
+class Rule:
+    def __init__(self, name, condition, description=""):
+        self.name = name
+        self.condition = condition
+        self.description = description
+
+
+class RuleSet:
+    def __init__(self, rules):
+        self.rules = list(rules)
+
+    def evaluate(self, df):
+        # Флаги всех правил за один проход; общие подвыражения вычисляются один раз
+        ctx = _Context(df)
+        return pd.DataFrame(
+            {rule.name: rule.condition.evaluate(ctx).astype(bool) for rule in self.rules},
+            index=df.index,
+        )
+
+
+ZERO_IN_HEATING = Rule(
+    "Нулевое потребление в ОП",
+    (num(CONSUMPTION) == 0) & col("Месяц").isin(HEATING_MONTHS),
+    "Нулевое потребление в отопительный период (октябрь — апрель)",
+)
+REPEATED_READING = Rule(
+    "Повтор показаний ОДПУ",
+    repeated_within(num(CONSUMPTION), by=METER),
+    "Одно и то же значение потребления встречается у счетчика несколько раз",
+)
+HIGH_DEVIATION = Rule(
+    "Выше среднего более чем на 25%",
+    deviation_pct(num(CONSUMPTION)) > 25,
+    "Потребление выше среднего по выборке более чем на 25%",
+)
+LOW_DEVIATION = Rule(
+    "Ниже среднего более чем на 25%",
+    deviation_pct(num(CONSUMPTION)) < -25,
+    "Потребление ниже среднего по выборке более чем на 25%",
+)
@@ -0,0 +1,158 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from addresses import AddressIndex
+from analyses import (
+    ZERO_FLAG,
+    clean_deviation_data,
+    deviation_flags,
+    deviation_table,
+    drop_comma_meters,
+    duplicate_readings,
+    flag_zero_consumption,
+    merge_temperature,
+    temperature_frame,
+)
+from dedup import RowDeduplicator
+from series import monthly_frame
+from validation import ValidationReport
+
+# Пакетный запуск анализов без Streamlit (для cron и серверов):
+#
+#     python cli.py выгрузки/*.csv --out reports --temperature Температуры.xlsx --workers 4
+#
+# Каждый файл обрабатывается в отдельном процессе теми же функциями, что и вкладки приложения;
+# отчеты пишутся в <out>/<имя файла>/<анализ>.parquet (или .csv), сводка запуска — в <out>/summary.csv.
+# Файлы с одинаковым именем из разных каталогов не принимаются: их отчеты попали бы в один каталог.
+# Как и во вкладках, полные дубликаты показаний удаляются только для анализа duplicates.
+
+ANALYSES = ["zero", "duplicates", "temperature", "deviation"]
+
+# Индексы справочника типов строений, уже построенные в этом процессе
+_address_indexes = {}
+
+
+def _address_index(path):
+    # Справочник читается и индексируется один раз на процесс-обработчик, а не для каждого файла
+    if path not in _address_indexes:
+        _address_indexes[path] = AddressIndex(pd.read_excel(path), address_col="Адрес объекта")
+    return _address_indexes[path]
+
+
+def _zero(df, quality, options):
+    df = drop_comma_meters(df, quality)
+    if options.building_types:
+        df = _address_index(options.building_types).join(df, address_col="Адрес объекта")
+    flagged = flag_zero_consumption(df)
+    return flagged[flagged[ZERO_FLAG]]
+
+
+def _duplicates(df, quality, options):
+    # Как во вкладке 2: сначала удаляются полные дубликаты по трём ключевым полям
+    unique = RowDeduplicator().filter(df, "")
+    grouped_dates, _ = duplicate_readings(unique, ValidationReport(unique))
+    return grouped_dates
+
+
+def _temperature(df, quality, options):
+    analysis_df = temperature_frame(merge_temperature(df, pd.read_excel(options.temperature)))
+    if analysis_df.empty:
+        return analysis_df
+    return monthly_frame(analysis_df)
+
+
+def _deviation(df, quality, options):
+    clean = clean_deviation_data(df, quality)
+    return pd.concat([deviation_table(clean), deviation_flags(clean)], axis=1)
+
+
+RUNNERS = {"zero": _zero, "duplicates": _duplicates, "temperature": _temperature, "deviation": _deviation}
+
+
+def _write(report, path, fmt):
+    if fmt == "parquet":
+        # Колонки смешанного типа (строки и числа из выгрузки) Parquet не принимает — они пишутся строками
+        report = report.copy()
+        for col in report.columns[report.dtypes == object]:
+            if report[col].map(type).nunique() > 1:
+                report[col] = report[col].astype(str)
+        report.to_parquet(path, index=False)
+    else:
+        report.to_csv(path, index=False, encoding="cp1251", errors="replace")
+
+
+def run_file(path, options):
+    # Все выбранные анализы одного файла; возвращает строки сводки запуска
+    started = time.perf_counter()
+    try:
+        df = pd.read_csv(path, encoding=options.encoding)
+        quality = ValidationReport(df)
+    except Exception as e:
+        return [{"Файл": path, "Анализ": "чтение", "Строк": 0, "Ошибка": f"{type(e).__name__}: {e}",
+                 "Время, с": round(time.perf_counter() - started, 2)}]
+    summary = [{"Файл": path, "Анализ": "чтение", "Строк": len(df), "Ошибка": "",
+                "Время, с": round(time.perf_counter() - started, 2)}]
+    out_dir = Path(options.out) / Path(path).stem
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    for name in options.analyses:
+        started = time.perf_counter()
+        try:
+            report = RUNNERS[name](df, quality, options)
+            _write(report, out_dir / f"{name}.{options.format}", options.format)
+            rows, error = len(report), ""
+        except Exception as e:
+            rows, error = 0, f"{type(e).__name__}: {e}"
+        summary.append({
+            "Файл": path, "Анализ": name, "Строк": rows, "Ошибка": error,
+            "Время, с": round(time.perf_counter() - started, 2),
+        })
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный анализ выгрузок теплопотребления")
+    parser.add_argument("files", nargs="+", help="CSV-выгрузки")
+    parser.add_argument("--out", default="reports", help="каталог отчетов")
+    parser.add_argument("--analyses", nargs="+", choices=ANALYSES, help="анализы (по умолчанию все доступные)")
+    parser.add_argument("--temperature", help="файл температур (xlsx) для анализа temperature")
+    parser.add_argument("--building-types", help="справочник типов строений (xlsx) для анализа zero")
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet")
+    parser.add_argument("--encoding", default="cp1251")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    options = parser.parse_args(argv)
+
+    if options.analyses is None:
+        options.analyses = [name for name in ANALYSES if name != "temperature" or options.temperature]
+    elif "temperature" in options.analyses and not options.temperature:
+        parser.error("для анализа temperature нужен --temperature")
+
+    # Каталог отчетов называется по имени файла без расширения — совпадающие имена перезаписали бы друг друга
+    stems = pd.Series([Path(path).stem for path in options.files])
+    clashes = [path for path, clash in zip(options.files, stems.duplicated(keep=False)) if clash]
+    if clashes:
+        parser.error("файлы с одинаковым именем: " + ", ".join(clashes))
+    return options
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    workers = max(1, min(options.workers or 1, len(options.files)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(run_file, options.files, [options] * len(options.files))
+        summary = pd.DataFrame([row for rows in results for row in rows])
+
+    Path(options.out).mkdir(parents=True, exist_ok=True)
+    summary.to_csv(Path(options.out) / "summary.csv", index=False, encoding="utf-8")
+    print(summary.to_string(index=False))
+    return 1 if (summary["Ошибка"] != "").any() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
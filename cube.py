@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+# Измерения куба; отсутствующие в выгрузке колонки просто не участвуют
+CUBE_DIMENSIONS = ["Год", "Месяц", "Район", "Тип объекта", "Категория здания"]
+MEASURES = ["Записей", "Показаний", "Сумма, Гкал", "Нулевых"]
+
+
+class ConsumptionCube:
+    # Предагрегированный куб: сумма, число показаний и нулевых значений потребления по каждой
+    # комбинации измерений. Строится один раз при загрузке; свертки и детализации по любому
+    # подмножеству измерений считаются по ячейкам куба, исходные строки нужны только для детальных таблиц.
+    def __init__(self, df, value_col="Текущее потребление, Гкал", dimensions=CUBE_DIMENSIONS):
+        self.dimensions = [col for col in dimensions if col in df.columns]
+        value = pd.to_numeric(df[value_col], errors="coerce")
+        cells = pd.DataFrame({
+            **{col: df[col] for col in self.dimensions},
+            "Записей": np.ones(len(df), dtype=np.int32),
+            "Показаний": value.notna().astype(np.int32),
+            "Сумма, Гкал": value.fillna(0),
+            "Нулевых": (value == 0).astype(np.int32),
+        })
+        self.cells = cells.groupby(self.dimensions, dropna=False, as_index=False, sort=True)[MEASURES].sum()
+
+    def _mask(self, filters):
+        # filters: измерение -> значение или список допустимых значений
+        mask = np.ones(len(self.cells), dtype=bool)
+        for col, allowed in (filters or {}).items():
+            if isinstance(allowed, (list, tuple, set, np.ndarray, pd.Index)):
+                mask &= self.cells[col].isin(allowed).to_numpy()
+            else:
+                mask &= (self.cells[col] == allowed).to_numpy()
+        return mask
+
+    def totals(self, filters=None):
+        return self.cells.loc[self._mask(filters), MEASURES].sum()
+
+    def rollup(self, by, filters=None):
+        # Свертка по выбранным измерениям; среднее и доля нулей выводятся из сумм, а не из строк
+        result = self.cells[self._mask(filters)].groupby(list(by), as_index=False, sort=True)[MEASURES].sum()
+        readings = result["Показаний"].where(result["Показаний"] > 0)
+        result["Среднее, Гкал"] = (result["Сумма, Гкал"] / readings).round(3)
+        result["Доля нулевых"] = (result["Нулевых"] / readings).round(3)
+        return result
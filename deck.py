@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# 5 знаков после запятой — около метра, точнее для карты не нужно, а JSON заметно короче
+COORD_DECIMALS = 5
+
+
+def compact_points(df, lat_col, lon_col, icons=None):
+    # Минимальный набор данных для слоя: координаты, индекс иконки и ключ строки.
+    # Адреса, типы и кириллические имена колонок в браузер не уходят — подробности
+    # по объекту показываются на сервере только после клика (см. show_picked).
+    # Ключ — метка строки в исходной таблице, а не позиция: при смене фильтров он не сдвигается
+    points = pd.DataFrame({
+        "x": df[lon_col].to_numpy(dtype="float64").round(COORD_DECIMALS),
+        "y": df[lat_col].to_numpy(dtype="float64").round(COORD_DECIMALS),
+        "k": df.index.to_numpy(dtype=np.int64),
+    })
+    if icons is not None:
+        points["i"] = icons
+    return points
+
+
+def deck_chart(deck, details, key):
+    # Карта с выбором объекта кликом; details — таблица с тем же индексом, что и у точек слоя
+    event = st.pydeck_chart(deck, on_select="rerun", selection_mode="single-object", key=key)
+    show_picked(event, details)
+
+
+def show_picked(event, details):
+    objects = [obj for layer_objects in event.selection.get("objects", {}).values() for obj in layer_objects]
+    # Выбор на карте с ключом переживает перезапуски; после смены фильтров или данных
+    # ключи объектов, которых больше нет в таблице, отбрасываются
+    keys = [obj["k"] for obj in objects if "k" in obj and obj["k"] in details.index]
+    if keys:
+        st.dataframe(details.loc[keys], use_container_width=True, hide_index=True)
+    else:
+        st.caption("Нажмите на объект на карте, чтобы увидеть подробности.")
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+from parsing import parse_dates
+
+DEDUP_KEYS = ["№ ОДПУ", "Дата текущего показания", "Текущее потребление, Гкал"]
+DEDUP_CHUNK_ROWS = 200_000
+MISSING_HASH = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _key_column(series, col):
+    # Единый вид колонки ключа: номер — строка, дата — datetime, остальное — float64.
+    # Строки хэшируются по уникальным значениям: хэш значения не зависит от выгрузки,
+    # поэтому колонку можно заменить числовым хэшем, разложенным по кодам строк.
+    # Пустой номер (код -1) получает постоянный хэш MISSING_HASH — без перехода через float
+    if col == "№ ОДПУ":
+        codes, uniques = pd.factorize(series)
+        hashes = pd.util.hash_pandas_object(pd.Index(uniques).astype(str).str.strip(), index=False).to_numpy()
+        return np.append(hashes.astype(np.uint64), MISSING_HASH)[codes]
+    if col.startswith("Дата"):
+        return parse_dates(series).astype("datetime64[ns]")
+    return pd.to_numeric(series, errors="coerce").astype("float64")
+
+
+def row_hashes(df, keys=DEDUP_KEYS):
+    # 64-битный хэш ключа строки. Колонки ключа приводятся к единому виду, чтобы одна и та же запись
+    # из разных файлов и кусков давала один хэш независимо от того, какие типы pandas вывел при чтении
+    key = pd.DataFrame({col: _key_column(df[col], col) for col in keys})
+    return pd.util.hash_pandas_object(key, index=False).to_numpy(dtype=np.uint64)
+
+
+class RowDeduplicator:
+    # Потоковое удаление точных дубликатов по нескольким выгрузкам. Хранится только отсортированный
+    # массив хэшей уже встреченных ключей (8 байт на запись) и номер файла, где ключ встретился впервые
+    # (2 байта) — память не зависит от ширины строк, а куски выгрузок читаются и отбрасываются по очереди.
+    # Совпадение 64-битных хэшей разных ключей при миллионах строк практически исключено.
+    def __init__(self, keys=DEDUP_KEYS):
+        self.keys = keys
+        self.seen = np.empty(0, dtype=np.uint64)
+        self.origin = np.empty(0, dtype=np.uint16)
+        self.files = []
+        self.stats = []
+
+    def filter(self, df, source):
+        # Оставляет строки куска, ключ которых еще не встречался; source — имя файла для отчета
+        if source not in self.files:
+            self.files.append(source)
+            self.stats.append({"Файл": source, "Строк": 0, "Дубликатов в файле": 0, "Дубликатов из других файлов": 0})
+        file_index = self.files.index(source)
+        stats = self.stats[file_index]
+        stats["Строк"] += len(df)
+        if df.empty:
+            return df
+
+        hashes = row_hashes(df, self.keys)
+        # Первое вхождение и число повторов каждого ключа внутри куска
+        unique_hashes, first, counts = np.unique(hashes, return_index=True, return_counts=True)
+        positions = np.searchsorted(self.seen, unique_hashes)
+        known = positions < len(self.seen)
+        known[known] = self.seen[positions[known]] == unique_hashes[known]
+
+        # Все вхождения уже встреченного ключа — дубликаты файла его первого вхождения;
+        # у новых ключей дубликаты — все вхождения, кроме первого
+        other = np.zeros(len(known), dtype=bool)
+        other[known] = self.origin[positions[known]] != file_index
+        stats["Дубликатов из других файлов"] += int(counts[other].sum())
+        stats["Дубликатов в файле"] += int(counts[known & ~other].sum() + (counts[~known] - 1).sum())
+
+        # Новые ключи вставляются на свои места, массив остается отсортированным
+        new = ~known
+        self.seen = np.insert(self.seen, positions[new], unique_hashes[new])
+        self.origin = np.insert(self.origin, positions[new], np.uint16(file_index))
+        return df.iloc[np.sort(first[new])]
+
+    def report(self):
+        return pd.DataFrame(self.stats, columns=["Файл", "Строк", "Дубликатов в файле", "Дубликатов из других файлов"])
+
+
+def read_unique(files, keys=DEDUP_KEYS, chunksize=DEDUP_CHUNK_ROWS, **read_kwargs):
+    # Чтение нескольких CSV кусками с удалением дубликатов по ключу за один проход
+    dedup = RowDeduplicator(keys)
+    frames = []
+    for file in files:
+        name = getattr(file, "name", str(file))
+        for chunk in pd.read_csv(file, chunksize=chunksize, **read_kwargs):
+            frames.append(dedup.filter(chunk, name))
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=keys)
+    return df, dedup.report()
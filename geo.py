@@ -0,0 +1,267 @@
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+
+METERS_PER_DEGREE = 111_320
+# С какого масштаба вместо агрегированных ячеек показываются отдельные иконки
+ICON_MIN_ZOOM = 14
+# Размер ячейки агрегации на экране, пикселей
+CELL_PIXELS = 48
+# Сколько объектов максимум отправляется на карту по видимой области
+VIEWPORT_LIMIT = 500
+
+
+def cell_size_degrees(zoom, pixels=CELL_PIXELS):
+    # Ширина ячейки по долготе, соответствующая pixels экранных пикселей на данном масштабе
+    return 360 / 2 ** zoom * pixels / 256
+
+
+def grid_aggregate(lat, lon, cell_deg, values=None, flags=None):
+    # Квадратная сетка в проекции Меркатора: шаг по широте уменьшается на cos(широты),
+    # чтобы ячейки на экране были квадратными. Агрегаты — за один проход через bincount.
+    lat = np.asarray(lat, dtype="float64")
+    lon = np.asarray(lon, dtype="float64")
+    if len(lat) == 0:
+        return pd.DataFrame(columns=["lat", "lon", "Объектов", "Гкал", "Аномалий"])
+    lat_step = cell_deg * np.cos(np.radians(np.nanmean(lat)))
+    rows = np.floor(lat / lat_step).astype(np.int64)
+    cols = np.floor(lon / cell_deg).astype(np.int64)
+    keys = (rows - rows.min()) * (cols.max() - cols.min() + 1) + (cols - cols.min())
+    _, inverse = np.unique(keys, return_inverse=True)
+
+    count = np.bincount(inverse)
+    cells = pd.DataFrame({
+        # Центр масс объектов ячейки, а не геометрический центр — кружок стоит там, где дома
+        "lat": np.bincount(inverse, weights=lat) / count,
+        "lon": np.bincount(inverse, weights=lon) / count,
+        "Объектов": count,
+    })
+    cells["Гкал"] = 0.0 if values is None else np.bincount(
+        inverse, weights=np.nan_to_num(np.asarray(values, dtype="float64"))
+    ).round(2)
+    cells["Аномалий"] = 0 if flags is None else np.bincount(
+        inverse, weights=np.asarray(flags, dtype="float64")
+    ).astype(np.int64)
+    return cells
+
+
+def aggregate_layer(cells, cell_deg, **kwargs):
+    # Кружок на ячейку: площадь пропорциональна числу объектов, цвет — доле аномалий (зеленый -> красный)
+    cells = cells.copy()
+    cell_meters = cell_deg * METERS_PER_DEGREE * np.cos(np.radians(cells["lat"].mean()))
+    share = cells["Объектов"] / cells["Объектов"].max()
+    cells["radius"] = (cell_meters * 0.5 * np.sqrt(share)).clip(lower=cell_meters * 0.15)
+    anomaly_share = (cells["Аномалий"] / cells["Объектов"]).to_numpy()
+    cells["color"] = [
+        [int(40 + 200 * s), int(170 * (1 - s)), 60, 180] for s in anomaly_share
+    ]
+    return pdk.Layer(
+        "ScatterplotLayer",
+        cells,
+        get_position="[lon, lat]",
+        get_radius="radius",
+        get_fill_color="color",
+        pickable=True,
+        **kwargs,
+    )
+
+
+AGGREGATE_TOOLTIP = {
+    "html": "Объектов: {Объектов}<br>Потребление: {Гкал} Гкал<br>Аномалий: {Аномалий}",
+    "style": {"backgroundColor": "white", "color": "black"},
+}
+
+
+class GridIndex:
+    # Равномерная сетка по координатам: точки отсортированы по (строка, столбец) ячейки,
+    # поэтому объекты одной строки сетки в пределах диапазона столбцов — непрерывный срез.
+    # Запрос по прямоугольнику — несколько searchsorted вместо полного сканирования.
+
+    def __init__(self, lat, lon, cell_deg=0.005):
+        lat = np.asarray(lat, dtype="float64")
+        lon = np.asarray(lon, dtype="float64")
+        valid = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+        self.cell_deg = cell_deg
+        self.lat = lat
+        self.lon = lon
+        rows = np.floor(lat[valid] / cell_deg).astype(np.int64)
+        cols = np.floor(lon[valid] / cell_deg).astype(np.int64)
+        self._row_min = rows.min() if len(valid) else 0
+        self._col_min = cols.min() if len(valid) else 0
+        self._width = (cols.max() - self._col_min + 1) if len(valid) else 1
+        keys = (rows - self._row_min) * self._width + (cols - self._col_min)
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._positions = valid[order]
+
+    def _cell(self, value, minimum):
+        return int(np.floor(value / self.cell_deg)) - minimum
+
+    def query(self, south, west, north, east):
+        # Позиции точек внутри прямоугольника
+        if len(self._keys) == 0:
+            return np.array([], dtype=np.int64)
+        row_from = max(self._cell(south, self._row_min), 0)
+        row_to = self._cell(north, self._row_min)
+        col_from = min(max(self._cell(west, self._col_min), 0), self._width - 1)
+        col_to = min(self._cell(east, self._col_min), self._width - 1)
+        if row_to < row_from or col_to < col_from:
+            return np.array([], dtype=np.int64)
+        rows = np.arange(row_from, row_to + 1, dtype=np.int64) * self._width
+        starts = np.searchsorted(self._keys, rows + col_from, side="left")
+        ends = np.searchsorted(self._keys, rows + col_to, side="right")
+        candidates = np.concatenate(
+            [self._positions[start:end] for start, end in zip(starts, ends) if end > start]
+            or [np.array([], dtype=np.int64)]
+        )
+        inside = (
+            (self.lat[candidates] >= south) & (self.lat[candidates] <= north)
+            & (self.lon[candidates] >= west) & (self.lon[candidates] <= east)
+        )
+        return candidates[inside]
+
+
+def top_priority(positions, priority, limit):
+    # Не более limit позиций с наибольшим приоритетом; частичная сортировка argpartition
+    if len(positions) <= limit:
+        return positions
+    scores = np.asarray(priority)[positions]
+    chosen = np.argpartition(-scores, limit - 1)[:limit]
+    return positions[chosen]
+
+
+# Фиксированная сетка для слоев плотности: около 250 м по долготе
+DENSITY_CELL_DEG = 0.004
+DENSITY_KEYS = ["Год", "Месяц", "Район", "Тип объекта"]
+
+
+def period_density(df, flags, value_col="Текущее потребление, Гкал", cell_deg=DENSITY_CELL_DEG):
+    # Агрегаты по ячейкам сетки для каждого (Год, Месяц), с разбивкой по району и типу объекта,
+    # чтобы фильтры карты применялись к готовым ячейкам без обращения к исходным строкам.
+    # Возвращает {(год, месяц): DataFrame[Район, Тип объекта, cell, lat, lon, Гкал, Аномалий, Объектов]}
+    lat = pd.to_numeric(df["Широта"], errors="coerce")
+    lon = pd.to_numeric(df["Долгота"], errors="coerce")
+    valid = (lat.notna() & lon.notna()).to_numpy()
+    lat_step = cell_deg * np.cos(np.radians(lat[valid].mean()))
+    cells = pd.DataFrame({
+        **{key: df[key].to_numpy()[valid] for key in DENSITY_KEYS},
+        "cell": (np.floor(lat[valid] / lat_step).astype(np.int64) * 1_000_000
+                 + np.floor(lon[valid] / cell_deg).astype(np.int64)).to_numpy(),
+        "lat": lat[valid].to_numpy(),
+        "lon": lon[valid].to_numpy(),
+        "Гкал": pd.to_numeric(df[value_col], errors="coerce").fillna(0).to_numpy()[valid],
+        "Аномалий": np.asarray(flags, dtype=np.int64)[valid],
+    })
+    grouped = cells.groupby(DENSITY_KEYS + ["cell"], dropna=False, sort=False).agg(
+        lat=("lat", "mean"), lon=("lon", "mean"), Гкал=("Гкал", "sum"), Аномалий=("Аномалий", "sum"),
+        Объектов=("lat", "size"),
+    ).reset_index()
+    return {
+        (year, month): grid.drop(columns=["Год", "Месяц"]).reset_index(drop=True)
+        for (year, month), grid in grouped.groupby(["Год", "Месяц"], sort=False)
+    }
+
+
+def density_layer(grid, weight_col, districts, building_types):
+    # Тепловая карта по готовым ячейкам периода: фильтр района/типа и сложение ячеек — без сырых строк
+    selected = grid[grid["Район"].isin(districts) & grid["Тип объекта"].isin(building_types)]
+    merged = selected.groupby("cell").agg(lat=("lat", "mean"), lon=("lon", "mean"), w=(weight_col, "sum"))
+    merged = merged[merged["w"] > 0]
+    return pdk.Layer(
+        "HeatmapLayer",
+        merged[["lon", "lat", "w"]],
+        id="density",
+        get_position="[lon, lat]",
+        get_weight="w",
+        radius_pixels=40,
+        aggregation="'SUM'",
+    )
+
+
+def grid_clusters(lat, lon, radius_m=300, min_size=3, groups=None):
+    # Кластеры соседних объектов за линейное время: точки раскладываются по ячейкам сетки
+    # со стороной radius_m, кластер — связная область занятых ячеек (соседи по 8 направлениям).
+    # groups (например, месяц) разделяет точки: кластеры не объединяют разные группы.
+    # Возвращает номер кластера для каждой точки, -1 — точка не входит в кластер из min_size и более.
+    lat = np.asarray(lat, dtype="float64")
+    lon = np.asarray(lon, dtype="float64")
+    if len(lat) == 0:
+        return np.array([], dtype=np.int64)
+    lat_step = radius_m / METERS_PER_DEGREE
+    lon_step = lat_step / np.cos(np.radians(np.nanmean(lat)))
+    rows = np.floor(lat / lat_step).astype(np.int64)
+    cols = np.floor(lon / lon_step).astype(np.int64)
+    # Отступ в одну ячейку с каждой стороны, чтобы соседи не "перетекали" через край строки или группы
+    rows = rows - rows.min() + 1
+    cols = cols - cols.min() + 1
+    width = cols.max() + 2
+    height = rows.max() + 2
+    group_codes = np.zeros(len(lat), dtype=np.int64) if groups is None else pd.factorize(groups)[0].astype(np.int64)
+    keys = (group_codes * height + rows) * width + cols
+    cell_keys, inverse = np.unique(keys, return_inverse=True)
+
+    sources, targets = [], []
+    for d_row in (-1, 0, 1):
+        for d_col in (-1, 0, 1):
+            if d_row == 0 and d_col == 0:
+                continue
+            neighbours = cell_keys + d_row * width + d_col
+            found = np.searchsorted(cell_keys, neighbours).clip(max=len(cell_keys) - 1)
+            exists = cell_keys[found] == neighbours
+            sources.append(np.flatnonzero(exists))
+            targets.append(found[exists])
+    sources = np.concatenate(sources)
+    targets = np.concatenate(targets)
+
+    # Распространение минимальной метки по соседям со "сжатием путей", пока метки меняются
+    labels = np.arange(len(cell_keys))
+    while True:
+        updated = labels.copy()
+        np.minimum.at(updated, sources, labels[targets])
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+
+    point_labels = pd.factorize(labels[inverse])[0]
+    sizes = np.bincount(point_labels)
+    point_labels[sizes[point_labels] < min_size] = -1
+    return pd.factorize(np.where(point_labels >= 0, point_labels, np.nan))[0]
+
+
+def cluster_summary(df, labels, meter_col="№ ОДПУ", lat_col="Широта", lon_col="Долгота", radius_m=300):
+    # Центр, размер и состав каждого кластера
+    members = df.loc[labels >= 0].assign(Кластер=labels[labels >= 0] + 1)
+    if members.empty:
+        return pd.DataFrame(columns=["Кластер", "lat", "lon", "Объектов", "radius", meter_col])
+    summary = members.groupby("Кластер").agg(
+        lat=(lat_col, "mean"),
+        lon=(lon_col, "mean"),
+        lat_span=(lat_col, lambda values: values.max() - values.min()),
+        lon_span=(lon_col, lambda values: values.max() - values.min()),
+        Объектов=(lat_col, "size"),
+        **{col: (col, "first") for col in ("Год", "Месяц") if col in members.columns},
+        **{meter_col: (meter_col, lambda meters: ", ".join(sorted(map(str, meters.unique()))))},
+    ).reset_index()
+    # Радиус круга — половина диагонали охвата кластера плюс запас в пол-ячейки
+    summary["radius"] = 0.5 * np.hypot(
+        summary["lat_span"] * METERS_PER_DEGREE,
+        summary["lon_span"] * METERS_PER_DEGREE * np.cos(np.radians(summary["lat"])),
+    ) + radius_m / 2
+    return summary.drop(columns=["lat_span", "lon_span"])
+
+
+def cluster_layer(summary):
+    # Полупрозрачные круги вокруг центров кластеров
+    return pdk.Layer(
+        "ScatterplotLayer",
+        summary[["lon", "lat", "radius", "Кластер", "Объектов"]],
+        id="clusters",
+        get_position="[lon, lat]",
+        get_radius="radius",
+        get_fill_color=[203, 43, 62, 60],
+        get_line_color=[203, 43, 62, 220],
+        stroked=True,
+        line_width_min_pixels=2,
+        pickable=True,
+    )
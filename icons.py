@@ -0,0 +1,136 @@
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+
+# Локальный атлас маркеров: одна строка ячеек ICON_CELL x ICON_CELL в порядке ICON_NAMES.
+# Карты не ходят за картинками во внешнюю сеть — pydeck встраивает локальный файл в deck.gl как data URL.
+ATLAS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "icons.png")
+ICON_CELL = 64
+
+ICON_COLORS = {
+    "blue": "#2A81CB",
+    "grey": "#7B7B7B",
+    "orange": "#CB8427",
+    "green": "#2AAD27",
+    "violet": "#9C2BCB",
+    "lightblue": "#7FC7FF",
+    "yellow": "#CAC428",
+    "red": "#CB2B3E",
+    "lightgreen": "#8FD36F",
+    "black": "#3D3D3D",
+    "darkgreen": "#1E6B1E",
+    "darkred": "#8B1A1A",
+    "brown": "#8B5A2B",
+    "medical": "#FFFFFF",
+}
+ICON_NAMES = np.array(list(ICON_COLORS), dtype=object)
+DEFAULT_ICON = "grey"
+
+# Тип объекта -> иконка. Ключи нормализуются, поэтому регистр и точки в названиях не важны.
+TYPE_ICONS = {
+    "Многоквартирный дом": "blue",
+    "Другое строение": "grey",
+    "Учебное заведение, комбинат, центр": "orange",
+    "Административные здания, конторы": "green",
+    "Дет. ясли и сады": "violet",
+    "Школы и ВУЗ": "orange",
+    "Жилое здание (гостиница, общежитие)": "lightblue",
+    "Магазины": "yellow",
+    "Больницы": "red",
+    "Интернат": "lightgreen",
+    "Общежитие": "lightblue",
+    "Автостоянка": "black",
+    "Нежилой дом": "grey",
+    "Гаражи": "black",
+    "Казармы и помещения вохр": "darkgreen",
+    "Пожарное депо": "darkred",
+    "Спортзалы, крытые стадионы и другие спортивные сооружения": "lightgreen",
+    "Групповая станция смешения": "grey",
+    "Автомойка": "black",
+    "Производственный объект": "brown",
+    "Медицинское учреждение": "medical",
+    "Объект": "grey",
+}
+
+
+def _type_key(obj_type):
+    return re.sub(r"[\s.]+", " ", str(obj_type).lower().replace("ё", "е")).strip()
+
+
+_ICON_POSITIONS = {name: position for position, name in enumerate(ICON_NAMES)}
+_TYPE_POSITIONS = {_type_key(obj_type): _ICON_POSITIONS[name] for obj_type, name in TYPE_ICONS.items()}
+
+ICON_MAPPING = {
+    name: {"x": position * ICON_CELL, "y": 0, "width": ICON_CELL, "height": ICON_CELL,
+           "anchorY": ICON_CELL, "mask": False}
+    for position, name in enumerate(ICON_NAMES)
+}
+
+
+def icon_indices(types, default=DEFAULT_ICON):
+    # Индексы иконок для колонки типов: словарь применяется к уникальным категориям, строки — через коды
+    codes, uniques = pd.factorize(types)
+    default_position = _ICON_POSITIONS[default]
+    lookup = np.array(
+        [_TYPE_POSITIONS.get(_type_key(obj_type), default_position) for obj_type in uniques] + [default_position],
+        dtype=np.int16,
+    )
+    # Код -1 (пропуск) попадает на последний элемент — иконку по умолчанию
+    return lookup[codes]
+
+
+def icon_names(types, default=DEFAULT_ICON):
+    return ICON_NAMES[icon_indices(types, default=default)]
+
+
+def build_icon_atlas(path=ATLAS_PATH):
+    # Отрисовка атласа маркеров; запускается вручную при изменении набора иконок: python icons.py
+    from PIL import Image, ImageDraw
+
+    atlas = Image.new("RGBA", (ICON_CELL * len(ICON_NAMES), ICON_CELL), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(atlas)
+    for position, (name, color) in enumerate(ICON_COLORS.items()):
+        left = position * ICON_CELL
+        center_x, center_y, radius = left + ICON_CELL // 2, ICON_CELL * 3 // 8, ICON_CELL * 9 // 32
+        outline = "#333333"
+        draw.polygon(
+            [(center_x - radius * 0.8, center_y + radius * 0.6),
+             (center_x + radius * 0.8, center_y + radius * 0.6),
+             (center_x, ICON_CELL - 2)],
+            fill=color, outline=outline,
+        )
+        draw.ellipse(
+            [center_x - radius, center_y - radius, center_x + radius, center_y + radius],
+            fill=color, outline=outline, width=2,
+        )
+        if name == "medical":
+            arm, width = radius * 0.65, radius * 0.22
+            draw.rectangle([center_x - width, center_y - arm, center_x + width, center_y + arm], fill="#CB2B3E")
+            draw.rectangle([center_x - arm, center_y - width, center_x + arm, center_y + width], fill="#CB2B3E")
+        else:
+            dot = radius * 0.4
+            draw.ellipse([center_x - dot, center_y - dot, center_x + dot, center_y + dot], fill="white")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    atlas.save(path, optimize=True)
+
+
+def icon_layer(data, get_position="[x, y]", **kwargs):
+    # IconLayer на локальном атласе; в data должна быть колонка "i" с именами из ICON_NAMES
+    params = dict(get_size=4, size_scale=10, pickable=True)
+    params.update(kwargs)
+    return pdk.Layer(
+        "IconLayer",
+        data,
+        icon_atlas=ATLAS_PATH,
+        icon_mapping=ICON_MAPPING,
+        get_icon="i",
+        get_position=get_position,
+        **params,
+    )
+
+
+if __name__ == "__main__":
+    build_icon_atlas()
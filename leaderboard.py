@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+LEADERBOARD_K = 20
+LEADERBOARD_KEYS = ["Год", "Месяц", "Район", "Тип объекта"]
+
+
+def _select(values, k, largest):
+    # Позиции k наибольших (наименьших) значений: частичный отбор argpartition, сортируются только они
+    if len(values) > k:
+        part = np.argpartition(-values if largest else values, k - 1)[:k]
+    else:
+        part = np.arange(len(values))
+    order = np.argsort(-values[part] if largest else values[part], kind="stable")
+    return part[order]
+
+
+class Leaderboard:
+    # Лидеры и аутсайдеры по показателю в каждой группе (период, район, тип объекта), не больше k строк
+    # на группу. Рейтинг для любого сочетания фильтров — объединение досок подходящих групп
+    # и отбор среди нескольких сотен строк вместо сортировки всей выборки.
+    def __init__(self, df, value_col, label_col="Упрощенный адрес", keys=LEADERBOARD_KEYS, k=LEADERBOARD_K):
+        self.value_col = value_col
+        self.label_col = label_col
+        self.keys = [col for col in keys if col in df.columns]
+        self.k = k
+        self.top = {}
+        self.bottom = {}
+        self.append(df)
+
+    def append(self, df):
+        # Новые строки сливаются только с досками тех групп, в которые они попали.
+        # Доска группы — пара массивов (значения, подписи), уже упорядоченная по рейтингу
+        values = pd.to_numeric(df[self.value_col], errors="coerce").to_numpy(dtype="float64")
+        valid = ~np.isnan(values)
+        if not valid.any():
+            return
+        values = values[valid]
+        labels = df[self.label_col].to_numpy(dtype=object)[valid]
+        codes, uniques = pd.factorize(pd.MultiIndex.from_frame(df.loc[valid, self.keys]))
+        order = np.argsort(codes, kind="stable")
+        bounds = np.flatnonzero(np.diff(codes[order])) + 1
+        for block in np.split(order, bounds):
+            key = uniques[codes[block[0]]]
+            for boards, largest in ((self.top, True), (self.bottom, False)):
+                block_values, block_labels = values[block], labels[block]
+                if key in boards:
+                    block_values = np.concatenate((boards[key][0], block_values))
+                    block_labels = np.concatenate((boards[key][1], block_labels))
+                picked = _select(block_values, self.k, largest)
+                boards[key] = (block_values[picked], block_labels[picked])
+
+    def query(self, filters, n=LEADERBOARD_K, largest=True):
+        # filters: измерение -> значение или список значений; измерения без фильтра не ограничивают
+        boards = self.top if largest else self.bottom
+        allowed = [
+            (position, set(value) if isinstance(value, (list, tuple, set, np.ndarray)) else {value})
+            for position, col in enumerate(self.keys) if col in filters
+            for value in [filters[col]]
+        ]
+        matched = [
+            board for key, board in boards.items()
+            if all(key[position] in values for position, values in allowed)
+        ]
+        if not matched:
+            return pd.DataFrame(columns=[self.label_col, self.value_col])
+        values = np.concatenate([board[0] for board in matched])
+        labels = np.concatenate([board[1] for board in matched])
+        picked = _select(values, n, largest)
+        return pd.DataFrame({self.label_col: labels[picked], self.value_col: values[picked]})
@@ -7,6 +7,33 @@ import pydeck as pdk
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+from addresses import AddressIndex
+from deck import compact_points, deck_chart
+from geo import (
+    ICON_MIN_ZOOM, VIEWPORT_LIMIT, AGGREGATE_TOOLTIP, GridIndex, cell_size_degrees, grid_aggregate, aggregate_layer,
+    top_priority, period_density, density_layer, grid_clusters, cluster_summary, cluster_layer
+)
+from icons import ICON_COLORS, icon_layer, icon_names
+from tables import paged_table, quality_panel
+from tiles import TILES_TOOLTIP, load_meta, tiles_layer
+from parsing import title_case
+from dedup import read_unique
+from snapshot import ADDED, CHANGED, DELTA, REMOVED, SnapshotDiff, anomaly_changes
+from pipeline import Pipeline, debug_panel
+from anomalies import HIGH_DEVIATION, LOW_DEVIATION, REPEATED_READING, ZERO_IN_HEATING
+from cube import ConsumptionCube
+from leaderboard import Leaderboard
+from series import MeterSeries, MonthMatrix, monthly_means
+from yoy import period_slice, yoy_tables
+from validation import ValidationReport, BAD_COORDINATES
+from metrics import (
+    add_specific_consumption, SPECIFIC_PER_AREA, SPECIFIC_PER_FLOOR, PERCENTILE_PER_AREA, PERCENTILE_PER_FLOOR
+)
+from analyses import (
+    clean_deviation_data, deviation_flags, deviation_table, drop_comma_meters, duplicate_readings,
+    flag_zero_consumption, merge_temperature, temperature_frame
+)
+
 # Настройка страницы
 st.set_page_config(page_title="Анализ теплопотребления", layout="wide")
 
@@ -15,24 +42,94 @@ st.sidebar.header("Выберите вкладку")
 tab_option = st.sidebar.selectbox(
     "Вкладка",
     ["0️⃣ Анализ нулевых значений (1 пример)", "🛢️ Анализ данных по ОДПУ (2 пример)", "🔅 Анализ потребления тепловой энергии (3 пример)",
-     "📈 Анализ отклонения (4 пример)", "📊 Анализ потребления (map.py)"]
+     "📈 Анализ отклонения (4 пример)", "📊 Анализ потребления (map.py)", "🔁 Сравнение выгрузок"]
 )
 
 # Вкладка 1: map.py
 if tab_option == "📊 Анализ потребления (map.py)":
     st.title("📊 Анализ потребления тепловой энергии")
 
+    # Конвейер вкладки: чтение, проверка, подготовка и все индексы по файлу строятся один раз на загрузку.
+    # Смена фильтров и перемещение карты берут готовые результаты, а не хэшируют всю таблицу заново
+    map_pipeline = Pipeline("map")
+
+    @map_pipeline.stage("uploaded_file")
+    def read_source(uploaded_file):
+        return pd.read_csv(uploaded_file, encoding="cp1251", sep=",")
+
+    @map_pipeline.stage("read_source")
+    def quality_report(source_df):
+        return ValidationReport(source_df)
+
+    @map_pipeline.stage("read_source", "quality_report")
+    def prepare_data(source_df, quality):
+        df = source_df.copy()
+        # Координаты вне диапазона не попадают ни на одну карту
+        if "Широта" in df.columns and "Долгота" in df.columns:
+            df.loc[quality.violations(BAD_COORDINATES), ["Широта", "Долгота"]] = np.nan
+
+        # Обработка пропусков в адресе
+        df["Упрощенный адрес"] = df["Упрощенный адрес"].fillna("Неизвестный адрес")
+        # Очистка и нормализация типа объекта
+        df["Тип объекта"] = title_case(df["Тип объекта"])
+        # Удельное потребление и перцентили в когортах считаются один раз при загрузке
+        return add_specific_consumption(df)
+
+    @map_pipeline.stage("prepare_data")
+    def spatial_index(df):
+        # Пространственный индекс и приоритет объектов для карты по видимой области:
+        # нулевое потребление важнее всего, дальше — удаленность от медианы своей когорты
+        if "Широта" not in df.columns or "Долгота" not in df.columns:
+            return None, None
+        index = GridIndex(
+            pd.to_numeric(df["Широта"], errors="coerce"), pd.to_numeric(df["Долгота"], errors="coerce")
+        )
+        severity = np.where(df["Текущее потребление, Гкал"] == 0, 2.0, 0.0)
+        if PERCENTILE_PER_AREA in df.columns:
+            severity += (df[PERCENTILE_PER_AREA].astype("float64") - 50).abs().fillna(0).to_numpy() / 50
+        return index, severity
+
+    # Сетки плотности потребления и аномалий для всех (Год, Месяц)
+    @map_pipeline.stage("prepare_data")
+    def density_grids(df):
+        return period_density(df, flags=df["Текущее потребление, Гкал"] == 0)
+
+    # Куб сумм и счетчиков по Год × Месяц × Район × Тип × Категория
+    @map_pipeline.stage("prepare_data")
+    def consumption_cube(df):
+        return ConsumptionCube(df)
+
+    # Рейтинги наибольшего и наименьшего потребления по группам (период, район, тип)
+    @map_pipeline.stage("prepare_data")
+    def leaderboards(df):
+        metrics = ["Текущее потребление, Гкал"] + [
+            col for col in [SPECIFIC_PER_AREA, SPECIFIC_PER_FLOOR] if col in df.columns
+        ]
+        return {metric: Leaderboard(df, metric) for metric in metrics}
+
+    # Матрица счетчик × месяц по всему файлу
+    @map_pipeline.stage("prepare_data")
+    def month_matrix(df):
+        meter_col = "№ ОДПУ" if "№ ОДПУ" in df.columns else "Упрощенный адрес"
+        return MonthMatrix(df, meter_col=meter_col)
+
+    # Сравнение с прошлым годом по счетчикам, районам и типам
+    @map_pipeline.stage("prepare_data")
+    def yoy_comparison(df):
+        meter_col = "№ ОДПУ" if "№ ОДПУ" in df.columns else "Упрощенный адрес"
+        return yoy_tables(df, meter_col=meter_col)
+
     # Фильтры
     uploaded_file = st.file_uploader("Загрузите CSV или TXT файл с данными", type=["csv", "txt"])
     if uploaded_file is not None:
         try:
-            df = pd.read_csv(uploaded_file, encoding="cp1251", sep=",")
+            stages = map_pipeline.run(
+                "quality_report", "prepare_data", "spatial_index", "consumption_cube", uploaded_file=uploaded_file
+            )
             st.success("✅ Файл успешно загружен!")
-
-            # Обработка пропусков в адресе
-            df["Упрощенный адрес"] = df["Упрощенный адрес"].fillna("Неизвестный адрес")
-            # Очистка и нормализация типа объекта
-            df["Тип объекта"] = df["Тип объекта"].astype(str).str.strip().str.title()
+            quality_panel(stages["quality_report"])
+            df = stages["prepare_data"]
+            grid_index, severity = stages["spatial_index"]
 
             # Фильтры
             st.subheader("Фильтры")
@@ -52,25 +149,38 @@ if tab_option == "📊 Анализ потребления (map.py)":
             )
 
             # Фильтрация данных
-            filtered_df = df[
+            filter_mask = (
                 (df["Год"] == year)
                 & (df["Месяц"] == month)
                 & (df["Район"].isin(district))
                 & (df["Тип объекта"].isin(building_type))
-                ]
+            )
+            filtered_df = df[filter_mask]
+
+            # Счетчики выборки — из куба, без прохода по строкам
+            cube = stages["consumption_cube"]
+            cube_filters = {"Год": year, "Месяц": month, "Район": district, "Тип объекта": building_type}
+            period_totals = cube.totals(cube_filters)
 
             # Вывод данных
-            st.subheader(f"📂 Отфильтрованные данные ({len(filtered_df)} записей)")
-            st.dataframe(filtered_df, use_container_width=True)
+            st.subheader(f"📂 Отфильтрованные данные ({int(period_totals['Записей'])} записей)")
+            paged_table(filtered_df, key="filtered_table")
 
             # График потребления
             st.subheader("📈 График потребления тепловой энергии")
             if "Текущее потребление, Гкал" in filtered_df.columns:
-                chart_data = (
-                    filtered_df[["Упрощенный адрес", "Текущее потребление, Гкал"]]
-                    .dropna()
-                    .sort_values("Текущее потребление, Гкал", ascending=False)
-                    .head(20)
+                chart_metrics = ["Текущее потребление, Гкал"] + [
+                    col for col in [SPECIFIC_PER_AREA, SPECIFIC_PER_FLOOR] if col in filtered_df.columns
+                ]
+                col_metric, col_rating = st.columns(2)
+                with col_metric:
+                    chart_metric = st.selectbox("Показатель", chart_metrics)
+                with col_rating:
+                    rating = st.radio("Рейтинг", ["Наибольшие", "Наименьшие"], horizontal=True)
+                # Готовые доски подходящих групп объединяются и из них отбираются 20 объектов
+                boards = map_pipeline.run("leaderboards", uploaded_file=uploaded_file)["leaderboards"]
+                chart_data = boards[chart_metric].query(
+                    cube_filters, n=20, largest=rating == "Наибольшие"
                 )
                 if not chart_data.empty:
                     st.bar_chart(chart_data.set_index("Упрощенный адрес"))
@@ -81,39 +191,28 @@ if tab_option == "📊 Анализ потребления (map.py)":
 
             # Аномалии
             st.subheader("🚨 Аномалии: Нулевое потребление")
-            zero_df = filtered_df[filtered_df["Текущее потребление, Гкал"] == 0]
-            if not zero_df.empty:
-                st.error(f"🔻 Найдено {len(zero_df)} объектов с нулевым потреблением:")
-                st.dataframe(zero_df, use_container_width=True)
+            if period_totals["Нулевых"] > 0:
+                st.error(f"🔻 Найдено {int(period_totals['Нулевых'])} объектов с нулевым потреблением:")
+                paged_table(filtered_df[filtered_df["Текущее потребление, Гкал"] == 0], key="zero_table")
             else:
                 st.success("✅ Нулевых значений не найдено.")
 
+            # Свертка и детализация по измерениям куба для выбранных районов и типов
+            st.subheader("🧮 Сводка по измерениям")
+            rollup_by = st.multiselect(
+                "Группировать по", cube.dimensions, default=[dim for dim in ["Район"] if dim in cube.dimensions]
+            )
+            whole_period = st.toggle("Все периоды", value=False)
+            rollup_filters = {"Район": district, "Тип объекта": building_type}
+            if not whole_period:
+                rollup_filters.update({"Год": year, "Месяц": month})
+            if rollup_by:
+                st.dataframe(cube.rollup(rollup_by, rollup_filters), hide_index=True, use_container_width=True)
+            else:
+                st.write(cube.totals(rollup_filters).to_frame("Итого").T)
+
             # Карта
             st.subheader("🗺️ Интерактивная карта объектов")
-            ICON_URLS = {
-                "Многоквартирный Дом": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-blue.png",
-                "Другое Строение": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-grey.png",
-                "Учебное Заведение, Комбинат, Центр": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-orange.png",
-                "Административные Здания, Конторы": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-green.png",
-                "Дет.Ясли И Сады": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-violet.png",
-                "Школы И Вуз": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-orange.png",
-                "Жилое Здание (Гостиница, Общежитие)": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-lightblue.png",
-                "Магазины": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-yellow.png",
-                "Больницы": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-red.png",
-                "Интернат": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-lightgreen.png",
-                "Общежитие": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-lightblue.png",
-                "Автостоянка": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-black.png",
-                "Нежилой Дом": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-grey.png",
-                "Гаражи": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-black.png",
-                "Казармы И Помещения Вохр": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-darkgreen.png",
-                "Пожарное Депо": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-darkred.png",
-                "Спортзалы, Крытые Стадионы И Другие Спортивные Сооружения": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-lightgreen.png",
-                "Групповая Станция Смешения": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-grey.png",
-                "Автомойка": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-black.png",
-                "Производственный Объект": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-brown.png",
-                "Медицинское Учреждение": "https://raw.githubusercontent.com/ellen-firs/hackathon/refs/heads/main/media/medical_15048702.png",
-                "Объект": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-grey.png"
-            }
 
             if "Широта" in filtered_df.columns and "Долгота" in filtered_df.columns:
                 map_df = (
@@ -131,54 +230,193 @@ if tab_option == "📊 Анализ потребления (map.py)":
                 )
                 map_df = map_df.rename(columns={"Широта": "lat", "Долгота": "lon"})
 
+                map_mode = st.radio("Режим карты", ["Весь город", "По видимой области"], horizontal=True)
+
+                if map_mode == "По видимой области":
+                    # Карта сообщает серверу видимую область; отправляются только объекты внутри нее,
+                    # не больше VIEWPORT_LIMIT и в первую очередь — с наиболее выраженными аномалиями.
+                    # При перемещении карты перерисовывается только слой объектов, а не вся карта.
+                    bounds = (st.session_state.get("viewport_map") or {}).get("bounds") or {}
+                    south_west = bounds.get("_southWest") or {}
+                    north_east = bounds.get("_northEast") or {}
+                    if south_west.get("lat") is not None and north_east.get("lat") is not None:
+                        positions = grid_index.query(
+                            south_west["lat"], south_west["lng"], north_east["lat"], north_east["lng"]
+                        )
+                    else:
+                        positions = grid_index.query(-90, -180, 90, 180)
+                    positions = positions[filter_mask.to_numpy()[positions]]
+                    shown = top_priority(positions, severity, VIEWPORT_LIMIT)
+                    st.caption(f"В видимой области {len(positions)} объектов, показано {len(shown)}.")
+
+                    visible = df.iloc[shown]
+                    objects_group = folium.FeatureGroup(name="Объекты")
+                    for lat, lon, address, obj_type, consumption, icon in zip(
+                        visible["Широта"], visible["Долгота"], visible["Упрощенный адрес"], visible["Тип объекта"],
+                        visible["Текущее потребление, Гкал"], icon_names(visible["Тип объекта"])
+                    ):
+                        folium.CircleMarker(
+                            location=[lat, lon],
+                            radius=6,
+                            color="#333333",
+                            weight=1,
+                            fill=True,
+                            fill_color=ICON_COLORS[icon],
+                            fill_opacity=0.85,
+                            popup=f"<b>{address}</b><br>Тип: {obj_type}<br>Потребление: {consumption} Гкал",
+                        ).add_to(objects_group)
+
+                    # Базовая карта не зависит от фильтров, чтобы не перезагружаться при их смене
+                    base_map = folium.Map(
+                        location=[pd.to_numeric(df["Широта"], errors="coerce").mean(),
+                                  pd.to_numeric(df["Долгота"], errors="coerce").mean()],
+                        zoom_start=11,
+                        tiles="cartodbpositron",
+                    )
+                    st_folium(
+                        base_map,
+                        key="viewport_map",
+                        feature_group_to_add=objects_group,
+                        returned_objects=["bounds"],
+                        height=600,
+                        use_container_width=True,
+                    )
+                else:
+                    # На мелком масштабе объекты агрегируются в ячейки сетки на сервере,
+                    # отдельные иконки отправляются только при достаточном приближении
+                    zoom = st.slider("Масштаб карты", min_value=9, max_value=17, value=11)
+
+                    if zoom >= ICON_MIN_ZOOM:
+                        # В браузер уходят только координаты и иконки из локального атласа,
+                        # адрес и потребление показываются по клику на объект
+                        points = compact_points(map_df, "lat", "lon", icons=icon_names(map_df["Тип объекта"]))
+                        objects_layer = icon_layer(points, id="objects")
+                        tooltip = False
+                    else:
+                        cell_deg = cell_size_degrees(zoom)
+                        cells = grid_aggregate(
+                            map_df["lat"],
+                            map_df["lon"],
+                            cell_deg,
+                            values=map_df["Текущее потребление, Гкал"],
+                            flags=map_df["Текущее потребление, Гкал"] == 0,
+                        )
+                        st.caption(
+                            f"{len(map_df)} объектов сгруппированы в {len(cells)} ячеек. "
+                            f"Отдельные объекты показываются с масштаба {ICON_MIN_ZOOM}."
+                        )
+                        objects_layer = aggregate_layer(cells, cell_deg, id="cells")
+                        tooltip = AGGREGATE_TOOLTIP
+
+                    # Слой плотности берется из готовой сетки выбранного месяца, смена месяца не пересчитывает строки
+                    layers = [objects_layer]
+                    density = st.selectbox("Слой плотности", ["Нет", "Потребление, Гкал", "Аномалии"])
+                    grids = map_pipeline.run("density_grids", uploaded_file=uploaded_file)["density_grids"]
+                    period_grid = grids.get((year, month))
+                    if density != "Нет" and period_grid is not None:
+                        weight_col = "Гкал" if density == "Потребление, Гкал" else "Аномалий"
+                        layers.insert(0, density_layer(period_grid, weight_col, district, building_type))
 
-                def get_icon_data(obj_type):
-                    return {
-                        "url": ICON_URLS.get(obj_type, ICON_URLS["Объект"]),
-                        "width": 30,
-                        "height": 30,
-                        "anchorY": 30,
-                    }
-
+                    view_state = pdk.ViewState(
+                        latitude=map_df["lat"].mean(),
+                        longitude=map_df["lon"].mean(),
+                        zoom=zoom,
+                        pitch=0,
+                    )
 
-                map_df["icon_data"] = map_df["Тип объекта"].apply(get_icon_data)
+                    r = pdk.Deck(layers=layers, initial_view_state=view_state, tooltip=tooltip)
+                    deck_chart(
+                        r,
+                        map_df[["Упрощенный адрес", "Тип объекта", "Текущее потребление, Гкал"]],
+                        key="consumption_map",
+                    )
+            else:
+                st.warning("В данных отсутствуют координаты (Широта / Долгота).")
 
-                icon_layer = pdk.Layer(
-                    type="IconLayer",
-                    data=map_df,
-                    get_icon="icon_data",
-                    get_position="[lon, lat]",
-                    get_size=4,
-                    size_scale=10,
-                    pickable=True,
-                    tooltip=True,
+            # Календарь по всему парку: помесячные показатели — редукции матрицы счетчик × месяц
+            st.subheader("🗓️ Календарь показаний по всему парку")
+            matrix = map_pipeline.run("month_matrix", uploaded_file=uploaded_file)["month_matrix"]
+            if matrix.values.size:
+                zero_runs = matrix.longest_zero_run()
+                year_over_year = matrix.year_over_year()
+                col_meters, col_coverage, col_zero_runs, col_yoy = st.columns(4)
+                col_meters.metric("Счетчиков", len(matrix.meters))
+                col_coverage.metric("Покрытие показаниями", f"{matrix.observed.mean():.1%}")
+                col_zero_runs.metric("Нули 3+ месяца подряд", int((zero_runs >= 3).sum()))
+                if np.isfinite(year_over_year).any():
+                    col_yoy.metric("Медиана к прошлому году", f"{np.nanmedian(year_over_year) - 1:+.1%}")
+
+                calendar_metric = st.selectbox(
+                    "Показатель календаря", ["Потребление, Гкал", "Доля нулевых показаний", "Покрытие показаниями"]
                 )
-
-                view_state = pdk.ViewState(
-                    latitude=map_df["lat"].mean(),
-                    longitude=map_df["lon"].mean(),
-                    zoom=11,
-                    pitch=0,
+                per_month = {
+                    "Потребление, Гкал": matrix.totals,
+                    "Доля нулевых показаний": matrix.zero_share,
+                    "Покрытие показаниями": matrix.coverage,
+                }[calendar_metric]()
+                calendar = matrix.calendar(per_month)
+                fig = go.Figure(go.Heatmap(
+                    z=calendar.to_numpy(),
+                    x=[str(month) for month in calendar.columns],
+                    y=[str(year) for year in calendar.index],
+                    colorscale="YlOrRd" if calendar_metric != "Покрытие показаниями" else "Greens",
+                    colorbar=dict(title=calendar_metric),
+                    hovertemplate="Год %{y}, месяц %{x}: %{z:.3f}<extra></extra>",
+                ))
+                fig.update_layout(
+                    xaxis_title="Месяц", yaxis_title="Год", height=120 + 40 * len(calendar), margin=dict(t=20)
                 )
-
-                tooltip = {
-                    "html": """
-                    <b>{Упрощенный адрес}</b><br>
-                    Тип: {Тип объекта}<br>
-                    Потребление: {Текущее потребление, Гкал} Гкал
-                    """,
-                    "style": {"backgroundColor": "white", "color": "black"},
-                }
-
-                r = pdk.Deck(layers=[icon_layer], initial_view_state=view_state, tooltip=tooltip)
-                st.pydeck_chart(r)
+                st.plotly_chart(fig, use_container_width=True)
             else:
-                st.warning("В данных отсутствуют координаты (Широта / Долгота).")
+                st.info("Нет показаний с годом и месяцем для календаря.")
+
+            # Тот же месяц прошлого года для выбранного периода, районов и типов
+            st.subheader(f"📅 Сравнение с {int(month):02d}.{int(year) - 1}")
+            yoy_pairs_df, yoy_rollups = map_pipeline.run("yoy_comparison", uploaded_file=uploaded_file)["yoy_comparison"]
+            period_pairs = period_slice(yoy_pairs_df, year, month)
+            period_pairs = period_pairs[
+                period_pairs["Район"].isin(district) & period_pairs["Тип объекта"].isin(building_type)
+            ]
+            if period_pairs.empty:
+                st.info("Нет показаний за этот же месяц прошлого года.")
+            else:
+                col_district, col_type = st.columns(2)
+                for column, rollup_col in ((col_district, "Район"), (col_type, "Тип объекта")):
+                    with column:
+                        rollup = period_slice(yoy_rollups[rollup_col], year, month)
+                        selected = district if rollup_col == "Район" else building_type
+                        st.dataframe(
+                            rollup[rollup[rollup_col].isin(selected)].drop(columns=["Год", "Месяц"]),
+                            hide_index=True, use_container_width=True
+                        )
+                paged_table(period_pairs.drop(columns=["Год", "Месяц"]), key="yoy_table")
         except Exception as e:
             st.error(f"❌ Ошибка при загрузке файла: {e}")
+
+        debug_panel(map_pipeline)
     else:
         st.info("⬆️ Загрузите CSV или TXT файл для начала анализа.")
 
+        # Общегородская карта из заранее собранных тайлов (python tiles.py выгрузка.csv):
+        # браузер загружает только тайлы видимой области с локального сервера
+        tiles_meta = load_meta()
+        if tiles_meta is not None:
+            st.subheader("🗺️ Карта объектов города")
+            st.caption(
+                f"Тайлы собраны {tiles_meta['generated']}: {tiles_meta['objects']} объектов."
+            )
+            st.pydeck_chart(pdk.Deck(
+                layers=[tiles_layer(tiles_meta)],
+                initial_view_state=pdk.ViewState(
+                    latitude=tiles_meta["center"][0],
+                    longitude=tiles_meta["center"][1],
+                    zoom=11,
+                    pitch=0,
+                ),
+                tooltip=TILES_TOOLTIP,
+                map_style=pdk.map_styles.CARTO_LIGHT,
+            ))
+
 # Вкладка 3: 1 пример.py (потом сделать её первой)
 elif tab_option == "0️⃣ Анализ нулевых значений (1 пример)":
     # Инструкция для пользователя
@@ -187,6 +425,35 @@ elif tab_option == "0️⃣ Анализ нулевых значений (1 пр
     Файл должен содержать данные о потреблении с колонками, разделенными запятыми.
     """)
 
+    # Индекс справочника типов строений строится один раз на сессию сервера
+    @st.cache_resource
+    def load_address_index():
+        dataframe2 = pd.read_excel('sourse/Тип_строения.xlsx')
+        return AddressIndex(dataframe2, address_col='Адрес объекта')
+
+    # Конвейер вкладки: чтение, проверка и объединение со справочником пересчитываются только при смене файла
+    zero_pipeline = Pipeline("zero")
+
+    @zero_pipeline.stage("uploaded_file")
+    def read_source(uploaded_file):
+        return pd.read_csv(uploaded_file, encoding='utf-8', sep=',')  # Разделитель - запятая
+
+    @zero_pipeline.stage("read_source")
+    def quality_report(dataframe1):
+        return ValidationReport(dataframe1)
+
+    @zero_pipeline.stage("read_source", "quality_report")
+    def clean_meters(dataframe1, quality):
+        # Удаление строк с запятыми в столбце "№ ОДПУ"
+        if '№ ОДПУ' not in dataframe1.columns:
+            return dataframe1
+        return drop_comma_meters(dataframe1, quality)
+
+    @zero_pipeline.stage("clean_meters")
+    def merge_building_types(dataframe1):
+        # Объединение со справочником по адресу и тег нулевого потребления в отопительный период
+        return flag_zero_consumption(load_address_index().join(dataframe1, address_col='Адрес объекта'))
+
     # Загрузка файла пользователем
     uploaded_file = st.file_uploader("Выберите файл TXT", type=["txt"])
 
@@ -194,46 +461,48 @@ elif tab_option == "0️⃣ Анализ нулевых значений (1 пр
     if uploaded_file is not None:
         # Чтение данных из загруженного файла
         try:
-            dataframe1 = pd.read_csv(uploaded_file, encoding='utf-8', sep=',')  # Разделитель - запятая
+            stages = zero_pipeline.run("quality_report", "clean_meters", uploaded_file=uploaded_file)
+            dataframe1 = stages["read_source"]
             st.success("Файл успешно загружен!")
 
             # Отображение полной таблицы исходных данных
             st.subheader("Исходные данные:")
-            st.dataframe(dataframe1)
+            paged_table(dataframe1, key="source_table")
+
+            # Проверка качества данных одним проходом
+            quality_panel(stages["quality_report"])
 
-            # Удаление строк с запятыми в столбце "№ ОДПУ"
             if '№ ОДПУ' in dataframe1.columns:
-                count_with_comma = dataframe1['№ ОДПУ'].astype(str).str.contains(',').sum()
-                dataframe1 = dataframe1[~dataframe1['№ ОДПУ'].astype(str).str.contains(',')]
-                st.write(f"Удалено {count_with_comma} строк с запятыми в столбце '№ ОДПУ'.")
+                st.write(f"Удалено {len(dataframe1) - len(stages['clean_meters'])} строк с запятыми в столбце '№ ОДПУ'.")
             else:
                 st.error("Столбец '№ ОДПУ' отсутствует в загруженном файле.")
 
             # Загрузка файла с типами строений
             try:
-                dataframe2 = pd.read_excel('sourse/Тип_строения.xlsx')
-                dataframe2 = dataframe2.drop_duplicates(subset='Адрес объекта')
-
-                # Приведение поля "Адрес объекта" к единому виду
-                dataframe1['Адрес объекта'] = dataframe1['Адрес объекта'].str.strip().str.lower()
-                dataframe2['Адрес объекта'] = dataframe2['Адрес объекта'].str.strip().str.lower()
-
                 # Объединение таблиц по "Адрес объекта"
-                merged_df = pd.merge(dataframe1, dataframe2, on='Адрес объекта', how='left')
-
-                # Добавляем новые столбцы для тегов
-                merged_df['Аномалия_нулевое_потребление_в_ОП'] = False
-                merged_df['Текущее потребление, Гкал'] = merged_df['Текущее потребление, Гкал'].fillna(0)
-
-                # Условие для аномалии нулевого потребления в отопительный период
-                merged_df['Аномалия_нулевое_потребление_в_ОП'] = (
-                    (merged_df['Текущее потребление, Гкал'] == 0) &
-                    (merged_df['Месяц'].isin([10, 11, 12, 1, 2, 3, 4]))
+                merged_df = zero_pipeline.run("merge_building_types", uploaded_file=uploaded_file)["merge_building_types"]
+
+                # Качество сопоставления адресов со справочником
+                match_counts = merged_df['Сопоставление адреса'].value_counts()
+                st.write(
+                    f"Сопоставлено адресов: точно — {match_counts.get('точное', 0)}, "
+                    f"по канонической форме — {match_counts.get('каноническое', 0)}, "
+                    f"нечетко — {match_counts.get('нечеткое', 0)}, "
+                    f"неоднозначно — {match_counts.get('неоднозначное', 0)}, "
+                    f"не найдено — {match_counts.get('нет', 0)} из {len(merged_df)} строк."
                 )
+                collisions = load_address_index().collisions
+                if not collisions.empty:
+                    with st.expander(f"Разные адреса справочника с одной канонической формой: {len(collisions)}"):
+                        st.dataframe(collisions, hide_index=True, use_container_width=True)
+                unmatched = merged_df.loc[merged_df['Сопоставление адреса'] == 'нет', 'Адрес объекта']
+                if not unmatched.empty:
+                    with st.expander("Адреса без типа строения"):
+                        st.dataframe(unmatched.value_counts().rename('Строк'))
 
                 # Отображение обработанных данных
                 st.subheader("Обработанные данные:")
-                st.dataframe(merged_df)
+                paged_table(merged_df, key="merged_table")
 
                 # Статистика по аномалиям
                 anomaly_counts = merged_df['Аномалия_нулевое_потребление_в_ОП'].value_counts()
@@ -263,57 +532,30 @@ elif tab_option == "0️⃣ Анализ нулевых значений (1 пр
                 if selected_month != "Все":
                     filtered_df = filtered_df[filtered_df['Месяц'] == selected_month]
 
-                # Словарь иконок
-                ICON_URLS = {
-                    "Многоквартирный дом": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-blue.png",
-                    "Другое Строение": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-grey.png",
-                    "Учебное Заведение, Комбинат, Центр": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-orange.png",
-                    "Административные Здания, Конторы": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-green.png",
-                    "Дет.Ясли И Сады": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-violet.png",
-                    "Школы И Вуз": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-orange.png",
-                    "Жилое Здание (Гостиница, Общежитие)": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-lightblue.png",
-                    "Магазины": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-yellow.png",
-                    "Больницы": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-red.png",
-                    "Интернат": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-lightgreen.png",
-                    "Общежитие": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-lightblue.png",
-                    "Автостоянка": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-black.png",
-                    "Нежилой Дом": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-grey.png",
-                    "Гаражи": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-black.png",
-                    "Казармы И Помещения Вохр": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-darkgreen.png",
-                    "Пожарное Депо": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-darkred.png",
-                    "Спортзалы, Крытые Стадионы И Другие Спортивные Сооружения": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-lightgreen.png",
-                    "Групповая Станция Смешения": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-grey.png",
-                    "Автомойка": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-black.png",
-                    "Производственный Объект": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-brown.png",
-                    "Медицинское Учреждение": "https://raw.githubusercontent.com/ellen-firs/hackathon/refs/heads/main/media/medical_15048702.png",
-                    "Объект": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-grey.png"
-                }
 
                 if "Широта" in filtered_df.columns and "Долгота" in filtered_df.columns:
                     map_df = filtered_df[["Упрощенный адрес", "Широта", "Долгота", "Тип объекта",
                                           "Текущее потребление, Гкал"]].dropna().copy()
                     map_df = map_df.rename(columns={"Широта": "lat", "Долгота": "lon"})
 
-                    def get_icon_data(obj_type):
-                        return {
-                            "url": ICON_URLS.get(obj_type, ICON_URLS["Объект"]),
-                            "width": 30,
-                            "height": 30,
-                            "anchorY": 30,
-                        }
-
-                    map_df["icon_data"] = map_df["Тип объекта"].apply(get_icon_data)
-
-                    icon_layer = pdk.Layer(
-                        type="IconLayer",
-                        data=map_df,
-                        get_icon="icon_data",
-                        get_position='[lon, lat]',
-                        get_size=4,
-                        size_scale=10,
-                        pickable=True,
-                        tooltip=True,
+                    # В браузер уходят только координаты и иконки, подробности — по клику
+                    points = compact_points(map_df, "lat", "lon", icons=icon_names(map_df["Тип объекта"]))
+                    objects_layer = icon_layer(points, id="objects")
+                    layers = [objects_layer]
+
+                    # Соседние объекты с нулевым потреблением в одном месяце — вероятнее всего
+                    # неисправность тепломагистрали, а не отдельных приборов учета
+                    cluster_source = filtered_df.dropna(subset=["Широта", "Долгота"])
+                    cluster_labels = grid_clusters(
+                        cluster_source["Широта"],
+                        cluster_source["Долгота"],
+                        groups=(cluster_source["Год"] * 100 + cluster_source["Месяц"]).to_numpy(),
                     )
+                    clusters = cluster_summary(cluster_source, cluster_labels)
+                    if not clusters.empty:
+                        st.write(f"Найдено кластеров соседних объектов с нулевым потреблением: {len(clusters)}")
+                        st.dataframe(clusters.drop(columns=["radius"]), hide_index=True)
+                        layers.insert(0, cluster_layer(clusters))
 
                     view_state = pdk.ViewState(
                         latitude=map_df["lat"].mean(),
@@ -322,17 +564,12 @@ elif tab_option == "0️⃣ Анализ нулевых значений (1 пр
                         pitch=0
                     )
 
-                    tooltip = {
-                        "html": """
-                        <b>{Упрощенный адрес}</b><br>
-                        Тип: {Тип объекта}<br>
-                        Потребление: {Текущее потребление, Гкал} Гкал
-                        """,
-                        "style": {"backgroundColor": "white", "color": "black"}
-                    }
-
-                    r = pdk.Deck(layers=[icon_layer], initial_view_state=view_state, tooltip=tooltip)
-                    st.pydeck_chart(r)
+                    r = pdk.Deck(layers=layers, initial_view_state=view_state, tooltip=False)
+                    deck_chart(
+                        r,
+                        map_df[["Упрощенный адрес", "Тип объекта", "Текущее потребление, Гкал"]],
+                        key="zero_consumption_map",
+                    )
                 else:
                     st.warning("В данных отсутствуют координаты (Широта / Долгота).")
 
@@ -356,82 +593,60 @@ elif tab_option == "0️⃣ Анализ нулевых значений (1 пр
 
         except Exception as e:
             st.error(f"Произошла ошибка при обработке файла: {e}")
+
+        debug_panel(zero_pipeline)
     else:
         st.info("Пожалуйста, загрузите файл для начала обработки.")
 
 elif tab_option == "🛢️ Анализ данных по ОДПУ (2 пример)":
 
-    # Функция для обработки данных
-    def process_data(df):
-        # Удаление записей без указанной даты текущего показания
-        df = df[~df['Дата текущего показания'].isna()]
-
-        # Преобразование даты
-        if 'Дата текущего показания' in df.columns:
-            df['Дата текущего показания'] = pd.to_datetime(df['Дата текущего показания'], errors='coerce')
-
-        # Удаление полных дубликатов по трём ключевым полям
-        df_unique = df.drop_duplicates(subset=['№ ОДПУ', 'Дата текущего показания', 'Текущее потребление, Гкал'])
-
-        # Сортировка по № ОДПУ и дате
-        df_sorted = df_unique.sort_values(by=['№ ОДПУ', 'Дата текущего показания'])
-
-        # Функция для проверки наличия дубликатов потребления
-        def has_any_duplicates(group):
-            # Проверяем, есть ли в группе хотя бы одно повторяющееся значение потребления
-            return group['Текущее потребление, Гкал'].duplicated(keep=False).any()
-
-        # Фильтрация групп с дубликатами потребления
-        duplicate_groups = df_sorted.groupby('№ ОДПУ').filter(has_any_duplicates)
-
-        # Создаем поле "дата" в формате DD-MM-YYYY
-        duplicate_groups['дата'] = duplicate_groups['Дата текущего показания'].dt.strftime('%d-%m-%Y')
-
-        # Группировка по № ОДПУ и сбор всех дат с дубликатами потребления
-        grouped_dates = (
-            duplicate_groups[duplicate_groups['Текущее потребление, Гкал'].duplicated(keep=False)]
-            .groupby('№ ОДПУ')['дата']
-            .apply(list)
-            .reset_index()
-            .rename(columns={'дата': 'даты'})
-        )
+    # Конвейер вкладки: чтение и поиск дубликатов пересчитываются только при смене файлов
+    odpu_pipeline = Pipeline("odpu")
 
-        # Функция для сортировки списка дат в формате "dd-mm-yyyy"
-        def sort_dates(date_list):
-            return sorted(date_list, key=lambda x: pd.to_datetime(x, format="%d-%m-%Y"))
+    @odpu_pipeline.stage("uploaded_files")
+    def read_odpu_file(uploaded_files):
+        # Выгрузки за соседние месяцы пересекаются: полные дубликаты по трём ключевым полям
+        # удаляются уже при чтении, в том числе между файлами
+        return read_unique(uploaded_files, encoding='cp1251')
 
-        # Применяем сортировку к каждому списку
-        grouped_dates['даты'] = grouped_dates['даты'].apply(sort_dates)
+    @odpu_pipeline.stage("read_odpu_file")
+    def quality_report(loaded):
+        df, _ = loaded
+        return ValidationReport(df)
 
-        # Извлечение адреса, широты и долготы
-        address_info = (
-            df[['№ ОДПУ', 'Адрес объекта', 'Широта', 'Долгота', 'Тип объекта']]
-            .drop_duplicates(subset=['№ ОДПУ'])  # Удаляем дубликаты по № ОДПУ
-            .set_index('№ ОДПУ')  # Индексируем по № ОДПУ
-        )
-
-        # Объединяем данные с grouped_dates по столбцу № ОДПУ
-        grouped_dates = grouped_dates.merge(
-            address_info,
-            left_on='№ ОДПУ',
-            right_index=True,
-            how='left'
+    # Функция для обработки данных
+    @odpu_pipeline.stage("read_odpu_file", "quality_report")
+    def process_data(loaded, quality):
+        df, _ = loaded
+        return duplicate_readings(df, quality)
+
+    @odpu_pipeline.stage("process_data")
+    def meter_series(processed):
+        # История каждого ОДПУ — непрерывный срез, отсортированный по дате показания
+        _, full_data = processed
+        return MeterSeries(
+            full_data,
+            date_col='Дата текущего показания',
+            columns=['№ ОДПУ', 'Адрес объекта', 'Тип объекта', 'Дата текущего показания', 'Текущее потребление, Гкал']
         )
 
-        return grouped_dates, df_unique
-
 
     # Streamlit-интерфейс
     st.title("Анализ данных по ОДПУ")
 
-    # Загрузка файла
-    uploaded_file = st.file_uploader("Загрузите CSV-файл", type=["csv"])
+    # Загрузка файлов: одна или несколько выгрузок за разные месяцы
+    uploaded_files = st.file_uploader("Загрузите CSV-файл", type=["csv"], accept_multiple_files=True)
 
-    if uploaded_file is not None:
-        # Чтение данных из загруженного файла
+    if uploaded_files:
+        # Чтение данных из загруженных файлов
         try:
-            df = pd.read_csv(uploaded_file, encoding='cp1251')
-            st.success("Файл успешно загружен!")
+            stages = odpu_pipeline.run("read_odpu_file", "quality_report", uploaded_files=uploaded_files)
+            df, dedup_report = stages["read_odpu_file"]
+            st.success("Файл успешно загружен!" if len(uploaded_files) == 1 else f"Загружено файлов: {len(uploaded_files)}")
+            removed = int(dedup_report[["Дубликатов в файле", "Дубликатов из других файлов"]].to_numpy().sum())
+            with st.expander(f"🧹 Удалено дубликатов: {removed}"):
+                st.dataframe(dedup_report, hide_index=True, use_container_width=True)
+            quality_panel(stages["quality_report"])
         except Exception as e:
             st.error(f"Ошибка при чтении файла: {e}")
             st.stop()
@@ -439,15 +654,18 @@ elif tab_option == "🛢️ Анализ данных по ОДПУ (2 прим
         # Обработка данных
         st.subheader("Обработка данных...")
         try:
-            result_df, full_data = process_data(df)
+            stages = odpu_pipeline.run("process_data", "meter_series", uploaded_files=uploaded_files)
+            result_df, full_data = stages["process_data"]
+            readings = stages["meter_series"]
             st.success("Данные успешно обработаны!")
         except Exception as e:
             st.error(f"Ошибка при обработке данных: {e}")
             st.stop()
 
-        # Отображение результатов
+        # Отображение результатов; суммарное потребление каждого ОДПУ — один reduceat по хранилищу
         st.subheader("Результаты")
-        st.dataframe(result_df)
+        totals = readings.aggregate('Текущее потребление, Гкал')
+        st.dataframe(result_df.assign(**{'Потребление за период, Гкал': result_df['№ ОДПУ'].map(totals).round(3)}))
 
         # Интерактивная карта
         st.subheader("🗺️ Интерактивная карта объектов с аномалиями")
@@ -455,58 +673,15 @@ elif tab_option == "🛢️ Анализ данных по ОДПУ (2 прим
         # Используем только первую таблицу (result_df) для карты
         map_data = result_df.copy()  # Только объекты с аномалиями
 
-        # Словарь иконок
-        ICON_URLS = {
-            "Многоквартирный дом": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-blue.png",
-            "Другое строение": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-grey.png",
-            "Учебное заведение, комбинат, центр": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-orange.png",
-            "Административные здания, конторы": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-green.png",
-            "Дет. ясли и сады": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-violet.png",
-            "Школы и ВУЗ": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-orange.png",
-            "Жилое здание (гостиница, общежитие)": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-lightblue.png",
-            "Магазины": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-yellow.png",
-            "Больницы": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-red.png",
-            "Интернат": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-lightgreen.png",
-            "Общежитие": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-lightblue.png",
-            "Автостоянка": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-black.png",
-            "Нежилой дом": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-grey.png",
-            "Гаражи": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-black.png",
-            "Казармы и помещения вохр": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-darkgreen.png",
-            "Пожарное депо": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-darkred.png",
-            "Спортзалы, крытые стадионы и другие спортивные сооружения": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-lightgreen.png",
-            "Групповая станция смешения": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-grey.png",
-            "Автомойка": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-black.png",
-            "Производственный объект": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-brown.png",
-            "Медицинское учреждение": "https://raw.githubusercontent.com/ellen-firs/hackathon/refs/heads/main/media/medical_15048702.png",
-            "Объект": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-grey.png"
-        }
 
         if "Широта" in map_data.columns and "Долгота" in map_data.columns:
             map_df = map_data[["Адрес объекта", "Широта", "Долгота", "Тип объекта"]].dropna().copy()
             map_df = map_df.rename(columns={"Широта": "lat", "Долгота": "lon"})
 
 
-            def get_icon_data(obj_type):
-                return {
-                    "url": ICON_URLS.get(obj_type, ICON_URLS["Объект"]),
-                    "width": 30,
-                    "height": 30,
-                    "anchorY": 30,
-                }
-
-
-            map_df["icon_data"] = map_df["Тип объекта"].apply(get_icon_data)
-
-            icon_layer = pdk.Layer(
-                type="IconLayer",
-                data=map_df,
-                get_icon="icon_data",
-                get_position='[lon, lat]',
-                get_size=4,
-                size_scale=10,
-                pickable=True,
-                tooltip=True,
-            )
+            # В браузер уходят только координаты и иконки, подробности — по клику
+            points = compact_points(map_df, "lat", "lon", icons=icon_names(map_df["Тип объекта"]))
+            objects_layer = icon_layer(points, id="objects")
 
             view_state = pdk.ViewState(
                 latitude=map_df["lat"].mean(),
@@ -516,120 +691,124 @@ elif tab_option == "🛢️ Анализ данных по ОДПУ (2 прим
             )
 
             # Отображение карты
-            st.pydeck_chart(pdk.Deck(
-                layers=[icon_layer],
-                initial_view_state=view_state,
-                tooltip={
-                    "html": "<b>Адрес:</b> {Адрес объекта}<br><b>Тип объекта:</b> {Тип объекта}",
-                    "style": {"backgroundColor": "steelblue", "color": "white"}
-                }
-            ))
-
-        # Выбор № ОДПУ
-        unique_odpu_numbers = result_df['№ ОДПУ'].unique()
-        selected_odpu = st.selectbox("Выберите № ОДПУ для детального анализа:", unique_odpu_numbers)
-
-        if selected_odpu:
-            # Фильтрация данных по выбранному № ОДПУ
-            detailed_data = full_data[full_data['№ ОДПУ'] == selected_odpu][[
-                '№ ОДПУ', 'Адрес объекта', 'Тип объекта', 'Дата текущего показания', 'Текущее потребление, Гкал'
-            ]].copy()
-
-            # Добавление столбца "Подразделение" (извлекаем первое слово из адреса)
-            detailed_data['Подразделение'] = detailed_data['Адрес объекта'].str.split().str[0]
-
-            # Форматирование даты
-            detailed_data['Дата текущего показания'] = detailed_data['Дата текущего показания'].dt.strftime('%d.%m.%Y')
-
-            # Переупорядочивание столбцов
-            detailed_data = detailed_data[[
-                'Подразделение', '№ ОДПУ', 'Адрес объекта', 'Тип объекта', 'Дата текущего показания',
-                'Текущее потребление, Гкал'
-            ]]
-
-            # Отображение детальной таблицы
-            st.subheader(f"Детальная информация для № ОДПУ: {selected_odpu}")
-
+            deck_chart(
+                pdk.Deck(layers=[objects_layer], initial_view_state=view_state, tooltip=False),
+                map_df[["Адрес объекта", "Тип объекта"]],
+                key="duplicates_map",
+            )
 
-            # Добавляем стиль для выделения строк с повторяющимися значениями потребления
-            def highlight_duplicates(dataframe):
-                # Создаем пустой DataFrame для стилей
-                styles = pd.DataFrame('', index=dataframe.index, columns=dataframe.columns)
-                # Создаем маску для строк с дубликатами в столбце "Текущее потребление, Гкал"
-                duplicated_mask = dataframe['Текущее потребление, Гкал'].duplicated(keep=False)
-                # Применяем стиль: пастельно-красный фон для строк с дубликатами
-                styles.loc[duplicated_mask, :] = 'background-color: #FFD6D6'
-                return styles
+        # Детальный анализ — отдельный фрагмент: смена № ОДПУ перезапускает только его,
+        # чтение файла, обработка и карта выше не пересчитываются
+        @st.fragment
+        def odpu_details(result_df, readings):
+            # Выбор № ОДПУ
+            unique_odpu_numbers = result_df['№ ОДПУ'].unique()
+            selected_odpu = st.selectbox("Выберите № ОДПУ для детального анализа:", unique_odpu_numbers)
+
+            if selected_odpu:
+                # История выбранного № ОДПУ — срез хранилища без просмотра всей таблицы
+                detailed_data = readings.block(selected_odpu)
+
+                # Добавление столбца "Подразделение" (извлекаем первое слово из адреса)
+                detailed_data['Подразделение'] = detailed_data['Адрес объекта'].str.split().str[0]
+
+                # Форматирование даты; исходные даты сохраняются для анализа аномалий
+                reading_dates = detailed_data['Дата текущего показания'].to_numpy()
+                detailed_data['Дата текущего показания'] = detailed_data['Дата текущего показания'].dt.strftime('%d.%m.%Y')
+
+                # Переупорядочивание столбцов
+                detailed_data = detailed_data[[
+                    'Подразделение', '№ ОДПУ', 'Адрес объекта', 'Тип объекта', 'Дата текущего показания',
+                    'Текущее потребление, Гкал'
+                ]]
+
+                # Отображение детальной таблицы
+                st.subheader(f"Детальная информация для № ОДПУ: {selected_odpu}")
+
+                # Сводка по показаниям выбранного ОДПУ — срез массива потребления
+                consumption = readings.values(selected_odpu, 'Текущее потребление, Гкал')
+                col_count, col_mean, col_max = st.columns(3)
+                col_count.metric("Показаний", len(consumption))
+                col_mean.metric("Среднее потребление, Гкал", f"{np.nanmean(consumption):.3f}")
+                col_max.metric("Максимальное потребление, Гкал", f"{np.nanmax(consumption):.3f}")
+
+                # Пастельно-красный фон для строк с повторяющимися значениями потребления;
+                # маска считается по всей таблице, стиль применяется только к странице
+                duplicated_mask = detailed_data['Текущее потребление, Гкал'].duplicated(keep=False)
+                paged_table(
+                    detailed_data,
+                    key="odpu_detail_table",
+                    row_styles=np.where(duplicated_mask, 'background-color: #FFD6D6', '')
+                )
 
+                # Экспорт детальной таблицы
+                csv_detailed = detailed_data.to_csv(index=False, encoding='cp1251')
+                st.download_button(
+                    label="Скачать детальную информацию как CSV",
+                    data=csv_detailed,
+                    file_name=f"detailed_{selected_odpu}.csv",
+                    mime="text/csv"
+                )
 
-            # Применяем стиль к детальной таблице
-            st.dataframe(detailed_data.style.apply(highlight_duplicates, axis=None))
 
-            # Экспорт детальной таблицы
-            csv_detailed = detailed_data.to_csv(index=False, encoding='cp1251')
-            st.download_button(
-                label="Скачать детальную информацию как CSV",
-                data=csv_detailed,
-                file_name=f"detailed_{selected_odpu}.csv",
-                mime="text/csv"
-            )
+                # Анализ аномалий
+                # Анализ аномалий
+                def analyze_anomalies(dataframe, reading_dates):
+                    # Для вычислений берутся исходные даты, а не повторный разбор отформатированных строк
+                    dataframe = dataframe.assign(**{'Дата текущего показания': reading_dates})
+
+                    # Тип 1: Дата в рамках одного отчетного периода (разница <= 30 дней)
+                    type_1_mask = dataframe.duplicated(subset=['Текущее потребление, Гкал'], keep=False)
+                    type_1_pairs = dataframe[type_1_mask].sort_values(
+                        by=['Текущее потребление, Гкал', 'Дата текущего показания'])
+                    type_1_count = 0
+
+                    for _, group in type_1_pairs.groupby('Текущее потребление, Гкал'):
+                        for i in range(1, len(group)):
+                            if (group.iloc[i]['Дата текущего показания'] - group.iloc[i - 1][
+                                'Дата текущего показания']).days <= 31:
+                                type_1_count += 1
+
+                    # Тип 2: День, месяц и потребление совпадают, но год отличается
+                    dataframe['Дата без года'] = dataframe['Дата текущего показания'].dt.strftime(
+                        '%d.%m')  # Убираем год из даты
+                    type_2_mask = dataframe.duplicated(subset=['Текущее потребление, Гкал', 'Дата без года'], keep=False)
+                    type_2_count = type_2_mask.sum()
+
+                    # Тип 3: Совпадает только потребление, но даты полностью разные
+                    type_3_mask = dataframe.duplicated(subset=['Текущее потребление, Гкал'],
+                                                       keep=False) & ~type_1_mask & ~type_2_mask
+                    type_3_count = type_3_mask.sum()
+
+                    return type_1_count, type_2_count, type_3_count
+
+
+                # Выполняем анализ аномалий
+                type_1_count, type_2_count, type_3_count = analyze_anomalies(detailed_data, reading_dates)
+
+                # Выводим результаты анализа
+                st.subheader("Анализ аномалий")
+                st.write(f"Обнаружено аномалий:")
+                st.write(
+                    f"- Тип 1 (одинаковые значения показателей в рамках одного отчетного периода): {type_1_count}"
+                    f"\n Рекомендация: Проверьте корректность данных за указанный период. "
+                    f"Возможные причины: ошибки приборов учета, некорректное снятие показаний или дублирование записей."
+                )
+                st.write(
+                    f"- Тип 2 (совпадают день, месяц и потребление, но год отличается): {type_2_count // 2}"
+                    f"\n Рекомендация: Проверьте процесс переноса данных между годами. "
+                    f"Возможные причины: автоматическое копирование данных из предыдущего года или ошибки в системе учета."
+                )
+                st.write(
+                    f"- Тип 3 (совпадает только потребление, но даты полностью разные): {type_3_count // 2}"
+                    f"\n Рекомендация: Проведите детальный анализ данных. "
+                    f"Возможные причины: стандартные фиксированные значения (например, минимальное потребление), "
+                    f"или совпадение в значении потребления."
+                )
 
+        odpu_details(result_df, readings)
 
-            # Анализ аномалий
-            # Анализ аномалий
-            def analyze_anomalies(dataframe):
-                # Преобразуем дату обратно в datetime для вычислений
-                dataframe['Дата текущего показания'] = pd.to_datetime(dataframe['Дата текущего показания'],
-                                                                      format='%d.%m.%Y')
-
-                # Тип 1: Дата в рамках одного отчетного периода (разница <= 30 дней)
-                type_1_mask = dataframe.duplicated(subset=['Текущее потребление, Гкал'], keep=False)
-                type_1_pairs = dataframe[type_1_mask].sort_values(
-                    by=['Текущее потребление, Гкал', 'Дата текущего показания'])
-                type_1_count = 0
-
-                for _, group in type_1_pairs.groupby('Текущее потребление, Гкал'):
-                    for i in range(1, len(group)):
-                        if (group.iloc[i]['Дата текущего показания'] - group.iloc[i - 1][
-                            'Дата текущего показания']).days <= 31:
-                            type_1_count += 1
-
-                # Тип 2: День, месяц и потребление совпадают, но год отличается
-                dataframe['Дата без года'] = dataframe['Дата текущего показания'].dt.strftime(
-                    '%d.%m')  # Убираем год из даты
-                type_2_mask = dataframe.duplicated(subset=['Текущее потребление, Гкал', 'Дата без года'], keep=False)
-                type_2_count = type_2_mask.sum()
-
-                # Тип 3: Совпадает только потребление, но даты полностью разные
-                type_3_mask = dataframe.duplicated(subset=['Текущее потребление, Гкал'],
-                                                   keep=False) & ~type_1_mask & ~type_2_mask
-                type_3_count = type_3_mask.sum()
-
-                return type_1_count, type_2_count, type_3_count
-
-
-            # Выполняем анализ аномалий
-            type_1_count, type_2_count, type_3_count = analyze_anomalies(detailed_data)
-
-            # Выводим результаты анализа
-            st.subheader("Анализ аномалий")
-            st.write(f"Обнаружено аномалий:")
-            st.write(
-                f"- Тип 1 (одинаковые значения показателей в рамках одного отчетного периода): {type_1_count}"
-                f"\n Рекомендация: Проверьте корректность данных за указанный период. "
-                f"Возможные причины: ошибки приборов учета, некорректное снятие показаний или дублирование записей."
-            )
-            st.write(
-                f"- Тип 2 (совпадают день, месяц и потребление, но год отличается): {type_2_count // 2}"
-                f"\n Рекомендация: Проверьте процесс переноса данных между годами. "
-                f"Возможные причины: автоматическое копирование данных из предыдущего года или ошибки в системе учета."
-            )
-            st.write(
-                f"- Тип 3 (совпадает только потребление, но даты полностью разные): {type_3_count // 2}"
-                f"\n Рекомендация: Проведите детальный анализ данных. "
-                f"Возможные причины: стандартные фиксированные значения (например, минимальное потребление), "
-                f"или совпадение в значении потребления."
-            )
+        debug_panel(odpu_pipeline)
 
     else:
         st.info("Загрузите CSV-файл, чтобы начать анализ.")
@@ -646,190 +825,185 @@ elif tab_option == "🔅 Анализ потребления тепловой э
     with col2:
         temp_file = st.file_uploader("Загрузите temp.xlsx", type="xlsx")
 
-    @st.cache_data
-    def process_data(usage_file, temp_file):
-        try:
-            # Обработка основного файла
-            if usage_file is None or usage_file.size == 0:
-                st.error("Файл no_usage_true.csv пуст или не загружен.")
-                return pd.DataFrame()
-
-            usage_df = pd.read_csv(usage_file, encoding='cp1251')
+    # Конвейер вкладки: файлы читаются один раз, объединение с температурой пересчитывается
+    # только при смене одного из файлов
+    thermal_pipeline = Pipeline("thermal")
 
-            # Проверка наличия данных
-            if usage_df.empty:
-                st.error("Файл no_usage_true.csv не содержит данных.")
-                return pd.DataFrame()
+    @thermal_pipeline.stage("usage_file")
+    def read_usage(usage_file):
+        return pd.read_csv(usage_file, encoding='cp1251')
 
-            # Преобразование даты
-            usage_df['Дата текущего показания'] = (
-                pd.to_datetime(usage_df['Дата текущего показания'], errors='coerce') - pd.DateOffset(months=1)
-            ).dt.strftime('%m-%Y')
+    @thermal_pipeline.stage("temp_file")
+    def read_temperature(temp_file):
+        return pd.read_excel(temp_file)
 
-            usage_df = usage_df.rename(columns={'Дата текущего показания': 'Дата_Показания'})
+    @thermal_pipeline.stage("read_usage", "read_temperature")
+    def process_data(usage_df, temp_df):
+        # Ошибки этапа не кэшируются: их показывает load_data при каждом перезапуске
+        if usage_df.empty:
+            raise ValueError("Файл no_usage_true.csv не содержит данных.")
 
-            # Обработка температурного файла
-            if temp_file is None or temp_file.size == 0:
-                st.error("Файл temp.xlsx пуст или не загружен.")
-                return pd.DataFrame()
+        # Объединение с температурой по месяцу показания
+        return merge_temperature(usage_df, temp_df)
 
-            temp_df = pd.read_excel(temp_file)
-            temp_df = temp_df.rename(columns={'Месяц': 'Дата_Показания'})
+    @thermal_pipeline.stage("process_data")
+    def analysis_frame(merged_df):
+        return temperature_frame(merged_df)
 
-            # Объединение данных
-            merged_df = usage_df.merge(temp_df, on='Дата_Показания', how='left')
-            return merged_df[merged_df['Температура'].notna()]
+    @thermal_pipeline.stage("analysis_frame")
+    def monthly_blocks(analysis_df):
+        # Среднемесячные потребление и температура для всех ОДПУ считаются один раз на пару файлов
+        if analysis_df.empty:
+            return None
+        return monthly_means(analysis_df)
 
-        except Exception as e:
-            st.error(f"Ошибка при обработке данных: {e}")
-            return pd.DataFrame()
+    @thermal_pipeline.stage("read_usage")
+    def usage_series(usage_df):
+        # Строки исходного файла по ОДПУ для детальной таблицы — без повторного чтения файла и фильтрации
+        return MeterSeries(usage_df)
 
     def load_data():
         if usage_file is None or temp_file is None:
-            return pd.DataFrame()
+            return None, None
 
-        merged_df = process_data(usage_file, temp_file)
+        # Обработка загруженных файлов
+        if usage_file.size == 0:
+            st.error("Файл no_usage_true.csv пуст или не загружен.")
+            return None, None
+        if temp_file.size == 0:
+            st.error("Файл temp.xlsx пуст или не загружен.")
+            return None, None
 
-        if merged_df.empty:
-            return pd.DataFrame()
-
-        analysis_df = merged_df[
-            ["№ ОДПУ", "Дата_Показания", "Текущее потребление, Гкал", "Температура"]
-        ].dropna()
-
-        analysis_df["Дата_Показания"] = pd.to_datetime(
-            analysis_df["Дата_Показания"], format="%m-%Y", errors="coerce"
-        )
-
-        return analysis_df.dropna(subset=["Дата_Показания"])
+        try:
+            stages = thermal_pipeline.run(usage_file=usage_file, temp_file=temp_file)
+        except Exception as e:
+            st.error(f"Ошибка при обработке данных: {e}")
+            return None, None
+        return stages["monthly_blocks"], stages["usage_series"]
 
-    analysis_df = load_data()
+    monthly, readings = load_data()
 
-    if analysis_df.empty:
+    if monthly is None:
         st.warning("Загрузите оба файла для начала анализа")
     else:
-        analysis_df = analysis_df.sort_values(by=["№ ОДПУ", "Дата_Показания"])
-        unique_odpu = sorted(analysis_df["№ ОДПУ"].unique())
-
-        st.header("Параметры визуализации")
-        selected_odpu = st.selectbox("Выберите № ОДПУ:", options=unique_odpu)
-
-        # Фильтрация данных
-        filtered_df = analysis_df[analysis_df["№ ОДПУ"] == selected_odpu]
-
-        # Создание агрегированных данных для графика
-        monthly_data = filtered_df.resample('M', on='Дата_Показания').agg({
-            "Текущее потребление, Гкал": "mean",
-            "Температура": "mean"
-        }).reset_index()
-
-        monthly_data["Год-Месяц"] = monthly_data["Дата_Показания"].dt.strftime("%Y-%m")
+        # Выбор ОДПУ, настройки графика и детальная таблица — отдельный фрагмент:
+        # их изменение не перечитывает файлы и не пересчитывает объединение с температурой
+        @st.fragment
+        def meter_chart(monthly, readings):
+            st.header("Параметры визуализации")
+            selected_odpu = st.selectbox("Выберите № ОДПУ:", options=monthly.meters)
+
+            # Среднемесячные данные выбранного ОДПУ — готовый непрерывный блок, без фильтрации и resample
+            monthly_data = monthly.block(selected_odpu)
+
+            # Элементы управления
+            st.subheader("Настройки графика")
+            col_date, col_checks = st.columns([2, 3])
+
+            with col_date:
+                date_range = st.date_input(
+                    "Временной диапазон",
+                    [monthly_data["Дата_Показания"].min().date(), monthly_data["Дата_Показания"].max().date()],
+                    min_value=monthly_data["Дата_Показания"].min().date(),
+                    max_value=monthly_data["Дата_Показания"].max().date()
+                )
 
-        # Элементы управления
-        st.subheader("Настройки графика")
-        col_date, col_checks = st.columns([2, 3])
+            with col_checks:
+                show_consumption = st.checkbox("Показать потребление", value=True)
+                show_temperature = st.checkbox("Показать температуру", value=True)
+                show_annotations = st.checkbox("Показать аннотации", value=True)
 
-        with col_date:
-            date_range = st.date_input(
-                "Временной диапазон",
-                [monthly_data["Дата_Показания"].min().date(), monthly_data["Дата_Показания"].max().date()],
-                min_value=monthly_data["Дата_Показания"].min().date(),
-                max_value=monthly_data["Дата_Показания"].max().date()
-            )
+            # Фильтрация по дате
+            filtered_monthly = monthly_data[
+                (monthly_data["Дата_Показания"].dt.date >= date_range[0]) &
+                (monthly_data["Дата_Показания"].dt.date <= date_range[1])
+            ]
 
-        with col_checks:
-            show_consumption = st.checkbox("Показать потребление", value=True)
-            show_temperature = st.checkbox("Показать температуру", value=True)
-            show_annotations = st.checkbox("Показать аннотации", value=True)
+            # Создание графика
+            fig = make_subplots(specs=[[{"secondary_y": True}]])
+
+            if show_consumption:
+                fig.add_trace(
+                    go.Bar(
+                        x=filtered_monthly["Год-Месяц"],
+                        y=filtered_monthly["Текущее потребление, Гкал"],
+                        name="Потребление (Гкал)",
+                        marker_color="green",
+                        opacity=0.7,
+                        text=filtered_monthly["Текущее потребление, Гкал"].round(1),
+                        textposition='outside' if show_annotations else None
+                    ),
+                    secondary_y=False
+                )
 
-        # Фильтрация по дате
-        filtered_monthly = monthly_data[
-            (monthly_data["Дата_Показания"].dt.date >= date_range[0]) &
-            (monthly_data["Дата_Показания"].dt.date <= date_range[1])
-        ]
+            if show_temperature:
+                fig.add_trace(
+                    go.Scatter(
+                        x=filtered_monthly["Год-Месяц"],
+                        y=filtered_monthly["Температура"],
+                        name="Температура (°C)",
+                        mode="lines+markers+text" if show_annotations else "lines+markers",
+                        line=dict(color="purple", width=2),
+                        marker=dict(size=8),
+                        text=filtered_monthly["Температура"].round(1).astype(str) + "°C",
+                        textposition="top center" if show_annotations else None
+                    ),
+                    secondary_y=True
+                )
 
-        # Создание графика
-        fig = make_subplots(specs=[[{"secondary_y": True}]])
-
-        if show_consumption:
-            fig.add_trace(
-                go.Bar(
-                    x=filtered_monthly["Год-Месяц"],
-                    y=filtered_monthly["Текущее потребление, Гкал"],
-                    name="Потребление (Гкал)",
-                    marker_color="green",
-                    opacity=0.7,
-                    text=filtered_monthly["Текущее потребление, Гкал"].round(1),
-                    textposition='outside' if show_annotations else None
-                ),
-                secondary_y=False
+            # Настройка осей
+            fig.update_xaxes(title_text="Месяц", tickangle=45)
+            fig.update_yaxes(title_text="Потребление (Гкал)", secondary_y=False,
+                             range=[0, filtered_monthly["Текущее потребление, Гкал"].max() * 1.2])
+            fig.update_yaxes(title_text="Температура (°C)", secondary_y=True,
+                             autorange="reversed")
+
+            # Общие настройки
+            fig.update_layout(
+                title=f"Анализ ОДПУ №{selected_odpu}",
+                legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+                hovermode="x unified",
+                margin=dict(l=20, r=20, t=40, b=20),
+                height=600
             )
 
-        if show_temperature:
-            fig.add_trace(
-                go.Scatter(
-                    x=filtered_monthly["Год-Месяц"],
-                    y=filtered_monthly["Температура"],
-                    name="Температура (°C)",
-                    mode="lines+markers+text" if show_annotations else "lines+markers",
-                    line=dict(color="purple", width=2),
-                    marker=dict(size=8),
-                    text=filtered_monthly["Температура"].round(1).astype(str) + "°C",
-                    textposition="top center" if show_annotations else None
-                ),
-                secondary_y=True
-            )
+            # Отображение графика
+            st.plotly_chart(fig, use_container_width=True)
 
-        # Настройка осей
-        fig.update_xaxes(title_text="Месяц", tickangle=45)
-        fig.update_yaxes(title_text="Потребление (Гкал)", secondary_y=False,
-                         range=[0, filtered_monthly["Текущее потребление, Гкал"].max() * 1.2])
-        fig.update_yaxes(title_text="Температура (°C)", secondary_y=True,
-                         autorange="reversed")
-
-        # Общие настройки
-        fig.update_layout(
-            title=f"Анализ ОДПУ №{selected_odpu}",
-            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-            hovermode="x unified",
-            margin=dict(l=20, r=20, t=40, b=20),
-            height=600
-        )
+            # Основная таблица с детальной информацией
+            st.subheader(f"Детальная информация по ОДПУ №{selected_odpu}")
+            detailed_columns = [
+                "Подразделение",
+                "№ ОДПУ",
+                "Вид энерг-а ГВС",
+                "Адрес объекта",
+                "Тип объекта",
+                "Дата текущего показания",
+                "Текущее потребление, Гкал"
+            ]
 
-        # Отображение графика
-        st.plotly_chart(fig, use_container_width=True)
-
-        # Основная таблица с детальной информацией
-        st.subheader(f"Детальная информация по ОДПУ №{selected_odpu}")
-        detailed_columns = [
-            "Подразделение",
-            "№ ОДПУ",
-            "Вид энерг-а ГВС",
-            "Адрес объекта",
-            "Тип объекта",
-            "Дата текущего показания",
-            "Текущее потребление, Гкал"
-        ]
+            # Инициализация detailed_df как пустой DataFrame
+            detailed_df = pd.DataFrame()
 
-        # Инициализация detailed_df как пустой DataFrame
-        detailed_df = pd.DataFrame()
+            try:
+                detailed_df = readings.block(selected_odpu, detailed_columns)
+                st.dataframe(detailed_df)
+            except Exception as e:
+                st.error(f"Ошибка при чтении детальных данных: {e}")
+
+            # Кнопка скачивания детальных данных
+            if not detailed_df.empty:
+                detailed_csv = detailed_df.to_csv(index=False).encode("utf-8")
+                st.download_button(
+                    label="Скачать данные",
+                    data=detailed_csv,
+                    file_name=f"odpu_{selected_odpu}_detailed_data.csv",
+                    mime="text/csv"
+                )
 
-        try:
-            detailed_df = pd.read_csv(usage_file, encoding='cp1251')
-            detailed_df = detailed_df[detailed_df["№ ОДПУ"] == selected_odpu][detailed_columns]
-            st.dataframe(detailed_df)
-        except Exception as e:
-            st.error(f"Ошибка при чтении детальных данных: {e}")
+        meter_chart(monthly, readings)
 
-        # Кнопка скачивания детальных данных
-        if not detailed_df.empty:
-            detailed_csv = detailed_df.to_csv(index=False).encode("utf-8")
-            st.download_button(
-                label="Скачать данные",
-                data=detailed_csv,
-                file_name=f"odpu_{selected_odpu}_detailed_data.csv",
-                mime="text/csv"
-            )
+    debug_panel(thermal_pipeline)
 
 # Вкладка 2: 4 пример.py
 elif tab_option == "📈 Анализ отклонения (4 пример)":
@@ -837,59 +1011,140 @@ elif tab_option == "📈 Анализ отклонения (4 пример)":
     st.header("Загрузка данных")
     uploaded_file = st.file_uploader("Загрузите CSV файл с данными", type=["csv"])
 
-    @st.cache_data
-    def load_data_1(uploaded_file):
-        if uploaded_file is None:
-            st.warning("Пожалуйста, загрузите файл.")
-            return pd.DataFrame()  # Возвращаем пустой DataFrame, если файл не загружен
+    # Конвейер вкладки: каждый этап пересчитывается, только если изменились его входы
+    deviation_pipeline = Pipeline("deviation")
 
-        try:
-            # Чтение загруженного файла
-            df = pd.read_csv(uploaded_file, encoding="cp1251")
+    @deviation_pipeline.stage("uploaded_file")
+    def read_source(uploaded_file):
+        return pd.read_csv(uploaded_file, encoding="cp1251")
 
-            # Обработка ГВС ИТП
-            df['ГВС ИТП да/нет'] = df['Вид энерг-а ГВС'].apply(
-                lambda x: 'да' if isinstance(x, str) and 'ГВС-ИТП' in x else 'нет'
-            )
+    @deviation_pipeline.stage("read_source")
+    def quality_report(source_df):
+        return ValidationReport(source_df)
 
-            # Преобразование числовых столбцов
-            numeric_cols = ['Этажность объекта', 'Общая площадь объекта', 'Текущее потребление, Гкал', 'Широта',
-                            'Долгота']
-            for col in numeric_cols:
-                df[col] = pd.to_numeric(
-                    df[col].astype(str).str.replace(',', '.'),
-                    errors='coerce'
-                )
+    @deviation_pipeline.stage("read_source", "quality_report")
+    def clean_data(source_df, quality):
+        return clean_deviation_data(source_df, quality)
 
-            # Обработка даты постройки
-            if 'Дата постройки' in df.columns:
-                df['Дата постройки'] = pd.to_datetime(
-                    df['Дата постройки'],
-                    errors='coerce'
-                ).dt.year
-
-            # Обработка Года и Месяца
-            df['Год'] = pd.to_numeric(df['Год'], errors='coerce').astype('Int64')
-            df['Месяц'] = pd.to_numeric(df['Месяц'], errors='coerce').astype('Int64')
-
-            # Удаляем строки с пропусками в ключевых столбцах
-            df = df.dropna(subset=[
-                'Этажность объекта',
-                'Дата постройки',
-                'Общая площадь объекта',
-                'Год',
-                'Месяц',
-                'Текущее потребление, Гкал'
-            ])
-
-            return df
-        except Exception as e:
-            st.error(f"Ошибка при обработке файла: {e}")
-            return pd.DataFrame()
+    @deviation_pipeline.stage("clean_data", "filters")
+    def filter_data(df, filters):
+        floor_range, area_range, year_range, consumption_year, consumption_month, gvs_filter, sort_column = filters
+        query = (
+                df['Этажность объекта'].between(*floor_range) &
+                df['Общая площадь объекта'].between(*area_range) &
+                df['Дата постройки'].between(*year_range)
+        )
+        if consumption_year:
+            query &= df['Год'] == consumption_year
+        if consumption_month:
+            query &= df['Месяц'] == consumption_month
+        if gvs_filter != 'Все':
+            query &= df['ГВС ИТП да/нет'] == gvs_filter
+
+        filtered_df = df[query]
+        if sort_column:
+            filtered_df = filtered_df.sort_values(sort_column, ascending=False)
+        return filtered_df
+
+    @deviation_pipeline.stage("filter_data")
+    def result_table(filtered_df):
+        # Формирование таблицы
+        result_df = deviation_table(filtered_df)
+
+        # Добавление строки среднего значения
+        if not result_df.empty:
+            average_consumption = result_df['Потребление, Гкал'].mean()
+            # Создаем строку со средним значением
+            average_row = pd.DataFrame([{
+                'Адрес объекта': 'Среднее значение',
+                'Потребление, Гкал': round(average_consumption, 2),
+                SPECIFIC_PER_AREA: round(float(result_df[SPECIFIC_PER_AREA].mean()), 4),
+                SPECIFIC_PER_FLOOR: round(float(result_df[SPECIFIC_PER_FLOOR].mean()), 4),
+                'Отклонение от среднего в %': 0.0
+            }], columns=result_df.columns)
+            # Объединяем основные данные и среднее значение. Обе части приводятся к object до concat:
+            # иначе nullable-колонки (Год, Месяц, перцентили) становятся Float64 — годы выводятся
+            # как 2023.0, а пустые ячейки '' в строке среднего такие колонки не принимают
+            result_df = pd.concat([result_df.astype(object), average_row.astype(object)], ignore_index=True)
+            result_df = result_df.fillna('')
+        else:
+            result_df['Отклонение от среднего в %'] = ''
+        return result_df
+
+    @deviation_pipeline.stage("filter_data")
+    def anomaly_flags(filtered_df):
+        # Правила отклонения от среднего по выборке за один проход; строки флагов совпадают
+        # с первыми строками result_table (после них идет только строка среднего значения)
+        return deviation_flags(filtered_df)
+
+    @deviation_pipeline.stage("result_table", "anomaly_flags")
+    def table_styles(result_df, flags):
+        # Цвет строк считается векторно по всей таблице: красный — отклонение ниже -25%, зеленый — выше 25%.
+        # Стили применяются только к отображаемой странице, поэтому большие выборки тоже подсвечиваются.
+        padding = np.zeros(len(result_df) - len(flags), dtype=bool)
+        return np.select(
+            [np.append(flags[LOW_DEVIATION.name].to_numpy(), padding),
+             np.append(flags[HIGH_DEVIATION.name].to_numpy(), padding)],
+            ['background-color: #FFCCCC', 'background-color: #CCFFCC'],
+            default=''
+        )
+
+    @deviation_pipeline.stage("result_table", "anomaly_flags")
+    def split_anomalies(result_df, flags):
+        # Строка со средним значением идет последней и в флаги не входит
+        filtered_anomalies = result_df.iloc[:len(flags)]
+        high_anomalies = filtered_anomalies[flags[HIGH_DEVIATION.name].to_numpy()]
+        low_anomalies = filtered_anomalies[flags[LOW_DEVIATION.name].to_numpy()]
+        return high_anomalies, low_anomalies
+
+    @deviation_pipeline.stage("result_table", "filter_data")
+    def map_frame(result_df, filtered_df):
+        # Строки объектов (без строки среднего) получают индекс исходной таблицы —
+        # по нему карта находит объект, выбранный кликом, и после смены фильтров
+        result_df = result_df.iloc[:len(filtered_df)].set_axis(filtered_df.index)
+
+        # Фильтрация данных с координатами
+        map_df = result_df[[
+            'Адрес объекта',
+            'Широта',
+            'Долгота',
+            'Тип объекта',
+            'Потребление, Гкал',
+            'Отклонение от среднего в %',
+            'Год',
+            'Месяц'
+        ]].dropna(subset=['Широта', 'Долгота']).copy()
+        # Преобразование координат в числовой формат
+        map_df['Широта'] = pd.to_numeric(map_df['Широта'], errors='coerce')
+        map_df['Долгота'] = pd.to_numeric(map_df['Долгота'], errors='coerce')
+        # Удаление строк с некорректными координатами
+        return map_df.dropna(subset=['Широта', 'Долгота'])
+
+    @deviation_pipeline.stage("map_frame")
+    def low_clusters(map_df):
+        # Соседние здания с заниженным потреблением в одном месяце чаще говорят о проблеме
+        # на тепломагистрали, чем о неисправности отдельных приборов учета
+        low_source = map_df[(map_df['Отклонение от среднего в %'] < -25).to_numpy()]
+        cluster_labels = grid_clusters(
+            low_source['Широта'],
+            low_source['Долгота'],
+            groups=(pd.to_numeric(low_source['Год']) * 100 + pd.to_numeric(low_source['Месяц'])).to_numpy(),
+        )
+        return cluster_summary(low_source, cluster_labels, meter_col='Адрес объекта')
 
 
     # Загрузка данных
-    df = load_data_1(uploaded_file)
+    if uploaded_file is None:
+        st.warning("Пожалуйста, загрузите файл.")
+        df = pd.DataFrame()
+    else:
+        try:
+            stages = deviation_pipeline.run("clean_data", uploaded_file=uploaded_file)
+            df = stages["clean_data"]
+            quality_panel(stages["quality_report"])
+        except Exception as e:
+            st.error(f"Ошибка при обработке файла: {e}")
+            df = pd.DataFrame()
 
     # Проверка наличия данных
     if df.empty:
@@ -927,118 +1182,33 @@ elif tab_option == "📈 Анализ отклонения (4 пример)":
         options=[None] + sorted(df['Месяц'].unique().tolist())
     )
     gvs_filter = st.selectbox('ГВС ИТП', ['Все', 'да', 'нет'])
-
-    # Применение фильтров
-    query = (
-            df['Этажность объекта'].between(*floor_range) &
-            df['Общая площадь объекта'].between(*area_range) &
-            df['Дата постройки'].between(*year_range)
+    sort_column = st.selectbox(
+        'Сортировка',
+        options=[None, SPECIFIC_PER_AREA, SPECIFIC_PER_FLOOR, PERCENTILE_PER_AREA, PERCENTILE_PER_FLOOR]
     )
-    if consumption_year:
-        query &= df['Год'] == consumption_year
-    if consumption_month:
-        query &= df['Месяц'] == consumption_month
-    if gvs_filter != 'Все':
-        query &= df['ГВС ИТП да/нет'] == gvs_filter
-
-    filtered_df = df[query]
-
-    # Формирование таблицы
-    result_df = filtered_df[[
-        'Адрес объекта',
-        'Тип объекта',
-        'Категория здания',
-        'Этажность объекта',
-        'Дата постройки',
-        'Общая площадь объекта',
-        'ГВС ИТП да/нет',
-        'Текущее потребление, Гкал',
-        'Год',
-        'Месяц',
-        'Широта',
-        'Долгота'
-    ]].rename(columns={
-        'Текущее потребление, Гкал': 'Потребление, Гкал'
-    })
-
-    # Добавление отклонения и среднего значения
-    if not result_df.empty:
-        average_consumption = result_df['Потребление, Гкал'].mean()
-        if average_consumption != 0:
-            result_df['Отклонение от среднего в %'] = (
-                    (result_df['Потребление, Гкал'] - average_consumption) / average_consumption * 100
-            ).round(2)
-        else:
-            result_df['Отклонение от среднего в %'] = 0.0
-        # Создаем строку со средним значением
-        average_row = pd.DataFrame([[
-            'Среднее значение',
-            None,
-            None,
-            None,
-            None,
-            None,
-            None,
-            round(average_consumption, 2),
-            None,
-            None,
-            None,
-            None,
-            0.0
-        ]], columns=result_df.columns)
-        # Объединяем основные данные и среднее значение
-        result_df = pd.concat([result_df, average_row], ignore_index=True)
-        result_df = result_df.fillna('')
-    else:
-        result_df['Отклонение от среднего в %'] = ''
-
-
-    # Функция для стилизации
-    def apply_styles(row):
-        if row['Адрес объекта'] == 'Среднее значение':
-            return ['' for _ in row.index]
-        try:
-            deviation = float(row['Отклонение от среднего в %'])
-        except (ValueError, TypeError):
-            return ['' for _ in row.index]
-        if deviation < -25:
-            return ['background-color: #FFCCCC' for _ in row.index]
-        elif deviation > 25:
-            return ['background-color: #CCFFCC' for _ in row.index]
-        else:
-            return ['' for _ in row.index]
-
 
-    # Применяем стили
-    styled_df = result_df.style.apply(apply_styles, axis=1)
+    # Этапы ниже фильтра пересчитываются только при изменении фильтров или файла
+    stages = deviation_pipeline.run(
+        uploaded_file=uploaded_file,
+        filters=(floor_range, area_range, year_range, consumption_year, consumption_month, gvs_filter, sort_column),
+    )
+    result_df = stages["result_table"]
+    row_styles = stages["table_styles"]
 
     # Вывод таблицы
     st.header('Результаты фильтрации')
     if result_df.empty:
         st.warning('Нет данных по выбранным параметрам')
     else:
-        # Проверка количества ячеек
-        max_cells = pd.get_option("styler.render.max_elements")
-        if result_df.size > max_cells:
-            st.info("Для выявления аномалий выберите схожие характеристики объектов, а также период показания")
-        else:
-            try:
-                st.dataframe(styled_df)
-            except Exception as e:
-                st.error(f"Произошла ошибка при отображении данных: {e}")
+        try:
+            paged_table(result_df, key="deviation_table", row_styles=row_styles)
+        except Exception as e:
+            st.error(f"Произошла ошибка при отображении данных: {e}")
 
     # Блок анализа аномалий
     if not result_df.empty and 'Отклонение от среднего в %' in result_df.columns:
         st.header('Анализ аномалий')
-        # Убираем строку со средним значением
-        filtered_anomalies = result_df[result_df['Адрес объекта'] != 'Среднее значение']
-        # Выделяем аномалии
-        high_anomalies = filtered_anomalies[
-            filtered_anomalies['Отклонение от среднего в %'] > 25
-            ]
-        low_anomalies = filtered_anomalies[
-            filtered_anomalies['Отклонение от среднего в %'] < -25
-            ]
+        high_anomalies, low_anomalies = stages["split_anomalies"]
 
 
         # Формируем отчет по аномалиям
@@ -1073,31 +1243,6 @@ elif tab_option == "📈 Анализ отклонения (4 пример)":
     # Блок карты аномалий
     st.header('🗺️ Интерактивная карта аномалий')
 
-    # Словарь иконок
-    ICON_URLS = {
-        "Многоквартирный Дом": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-blue.png",
-        "Другое Строение": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-grey.png",
-        "Учебное Заведение, Комбинат, Центр": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-orange.png",
-        "Административные Здания, Конторы": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-green.png",
-        "Дет.Ясли И Сады": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-violet.png",
-        "Школы И Вуз": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-orange.png",
-        "Жилое Здание (Гостиница, Общежитие)": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-lightblue.png",
-        "Магазины": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-yellow.png",
-        "Больницы": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-red.png",
-        "Интернат": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-lightgreen.png",
-        "Общежитие": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-lightblue.png",
-        "Автостоянка": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-black.png",
-        "Нежилой Дом": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-grey.png",
-        "Гаражи": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-black.png",
-        "Казармы И Помещения Вохр": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-darkgreen.png",
-        "Пожарное Депо": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-darkred.png",
-        "Спортзалы, Крытые Стадионы И Другие Спортивные Сооружения": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-lightgreen.png",
-        "Групповая Станция Смешения": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-grey.png",
-        "Автомойка": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-black.png",
-        "Производственный Объект": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-brown.png",
-        "Медицинское Учреждение": "https://raw.githubusercontent.com/ellen-firs/hackathon/refs/heads/main/media/medical_15048702.png",
-        "Объект": "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-grey.png"
-    }
 
     # Подготовка данных для карты
     if not result_df.empty and 'Широта' in result_df.columns and 'Долгота' in result_df.columns:
@@ -1105,20 +1250,7 @@ elif tab_option == "📈 Анализ отклонения (4 пример)":
         if result_df[['Широта', 'Долгота']].isnull().all().all():
             st.error("Все значения координат отсутствуют!")
         else:
-            # Фильтрация данных с координатами
-            map_df = result_df[[
-                'Адрес объекта',
-                'Широта',
-                'Долгота',
-                'Тип объекта',
-                'Потребление, Гкал',
-                'Отклонение от среднего в %'
-            ]].dropna(subset=['Широта', 'Долгота']).copy()
-            # Преобразование координат в числовой формат
-            map_df['Широта'] = pd.to_numeric(map_df['Широта'], errors='coerce')
-            map_df['Долгота'] = pd.to_numeric(map_df['Долгота'], errors='coerce')
-            # Удаление строк с некорректными координатами
-            map_df = map_df.dropna(subset=['Широта', 'Долгота'])
+            map_df = stages["map_frame"]
             # Проверка наличия данных после фильтрации
             if map_df.empty:
                 st.warning("Нет данных с корректными координатами для отображения на карте")
@@ -1128,55 +1260,30 @@ elif tab_option == "📈 Анализ отклонения (4 пример)":
                 center_lon = map_df['Долгота'].mean()
 
                 # Разделение на аномалии
-                high_anomalies_map = map_df[map_df['Отклонение от среднего в %'] > 25]
-                low_anomalies_map = map_df[map_df['Отклонение от среднего в %'] < -25]
-
-
-                # Функция для получения иконки
-                def get_icon(obj_type, anomaly_type):
-                    default_icons = {
-                        'high': "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-red.png",
-                        'low': "https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-blue.png"
-                    }
-                    return {
-                        "url": ICON_URLS.get(obj_type, default_icons[anomaly_type]),
-                        "width": 30,
-                        "height": 30,
-                        "anchorY": 30
-                    }
-
-
-                # Подготовка данных для слоев
+                high_mask = (map_df['Отклонение от среднего в %'] > 25).to_numpy()
+                low_mask = (map_df['Отклонение от среднего в %'] < -25).to_numpy()
+
+                # Подготовка данных для слоев: в браузер уходят только координаты и иконки.
+                # Известные типы получают свою иконку, остальные — красную (высокое потребление) или синюю (низкое)
+                points = compact_points(map_df, 'Широта', 'Долгота')
+                points['i'] = np.where(
+                    high_mask,
+                    icon_names(map_df['Тип объекта'], default='red'),
+                    icon_names(map_df['Тип объекта'], default='blue')
+                )
                 layers = []
-                if not high_anomalies_map.empty:
-                    high_anomalies_map.loc[:, 'icon_data'] = high_anomalies_map['Тип объекта'].apply(
-                        lambda x: get_icon(x, 'high')
-                    )
-                    high_layer = pdk.Layer(
-                        "IconLayer",
-                        high_anomalies_map,
-                        get_icon="icon_data",
-                        get_position="[Долгота, Широта]",
-                        get_size=4,
-                        size_scale=10,
-                        pickable=True
-                    )
-                    layers.append(high_layer)
+                if high_mask.any():
+                    layers.append(icon_layer(points[high_mask], id="high_anomalies"))
 
-                if not low_anomalies_map.empty:
-                    low_anomalies_map.loc[:, 'icon_data'] = low_anomalies_map['Тип объекта'].apply(
-                        lambda x: get_icon(x, 'low')
-                    )
-                    low_layer = pdk.Layer(
-                        "IconLayer",
-                        low_anomalies_map,
-                        get_icon="icon_data",
-                        get_position="[Долгота, Широта]",
-                        get_size=4,
-                        size_scale=10,
-                        pickable=True
-                    )
-                    layers.append(low_layer)
+                if low_mask.any():
+                    layers.append(icon_layer(points[low_mask], id="low_anomalies"))
+
+                # Кластеры соседних зданий с низким потреблением в одном месяце
+                clusters = stages["low_clusters"]
+                if not clusters.empty:
+                    st.subheader(f"Кластеры зданий с низким потреблением: {len(clusters)}")
+                    st.dataframe(clusters.drop(columns=['radius']), hide_index=True)
+                    layers.insert(0, cluster_layer(clusters))
 
                 # Настройка вида карты
                 view_state = pdk.ViewState(
@@ -1186,21 +1293,87 @@ elif tab_option == "📈 Анализ отклонения (4 пример)":
                     pitch=0
                 )
 
-                # Настройка подсказок
-                tooltip = {
-                    "html": "<b>{Адрес объекта}</b><br/>"
-                            "Тип: {Тип объекта}<br/>"
-                            "Потребление: {Потребление, Гкал} Гкал<br/>"
-                            "Отклонение: {Отклонение от среднего в %}%",
-                    "style": {"backgroundColor": "white", "color": "black"}
-                }
-
-                # Отрисовка карты
-                st.pydeck_chart(pdk.Deck(
-                    layers=layers,
-                    initial_view_state=view_state,
-                    tooltip=tooltip,
-                    map_style=pdk.map_styles.CARTO_LIGHT
-                ))
+                # Отрисовка карты; адрес, потребление и отклонение показываются по клику на объект
+                deck_chart(
+                    pdk.Deck(
+                        layers=layers,
+                        initial_view_state=view_state,
+                        tooltip=False,
+                        map_style=pdk.map_styles.CARTO_LIGHT
+                    ),
+                    map_df,
+                    key="deviation_map",
+                )
     else:
         st.info("Данные о координатах отсутствуют в выборке")
+
+    debug_panel(deviation_pipeline)
+
+# Вкладка: сравнение исходной и исправленной выгрузок одного периода
+elif tab_option == "🔁 Сравнение выгрузок":
+    st.title("🔁 Сравнение выгрузок")
+    st.write("Какие показания добавлены, удалены или изменены в исправленной выгрузке")
+
+    col_old, col_new = st.columns(2)
+    with col_old:
+        old_file = st.file_uploader("Исходная выгрузка", type=["csv"], key="snapshot_old")
+    with col_new:
+        new_file = st.file_uploader("Исправленная выгрузка", type=["csv"], key="snapshot_new")
+
+    # Конвейер вкладки: сравнение и пересчет аномалий выполняются только при смене одного из файлов
+    snapshot_pipeline = Pipeline("snapshot")
+
+    @snapshot_pipeline.stage("old_file")
+    def read_old(old_file):
+        return pd.read_csv(old_file, encoding='cp1251')
+
+    @snapshot_pipeline.stage("new_file")
+    def read_new(new_file):
+        return pd.read_csv(new_file, encoding='cp1251')
+
+    @snapshot_pipeline.stage("read_old", "read_new")
+    def snapshot_diff(old_df, new_df):
+        return SnapshotDiff(old_df, new_df)
+
+    @snapshot_pipeline.stage("read_old", "read_new", "snapshot_diff")
+    def affected_anomalies(old_df, new_df, diff):
+        # Аномалии пересчитываются только по счетчикам с изменившимися показаниями
+        rules = [REPEATED_READING] + ([ZERO_IN_HEATING] if 'Месяц' in new_df.columns and 'Месяц' in old_df.columns else [])
+        return anomaly_changes(old_df, new_df, diff.affected_meters(), rules)
+
+    if old_file is not None and new_file is not None:
+        try:
+            stages = snapshot_pipeline.run(old_file=old_file, new_file=new_file)
+        except Exception as e:
+            st.error(f"Ошибка при сравнении выгрузок: {e}")
+            st.stop()
+
+        diff = stages["snapshot_diff"]
+        counts = diff.counts()
+        col_added, col_removed, col_changed, col_same = st.columns(4)
+        col_added.metric("Добавлено", counts[ADDED])
+        col_removed.metric("Удалено", counts[REMOVED])
+        col_changed.metric("Изменено", counts[CHANGED])
+        col_same.metric("Без изменений", diff.unchanged)
+
+        if diff.changes.empty:
+            st.success("Выгрузки совпадают")
+        else:
+            st.metric("Итоговая разница, Гкал", f"{diff.changes[DELTA].sum():+,.3f}")
+
+            kinds = st.multiselect("Изменения", [ADDED, REMOVED, CHANGED], default=[ADDED, REMOVED, CHANGED])
+            changes = diff.changes[diff.changes["Изменение"].isin(kinds)]
+            paged_table(changes, key="snapshot_changes")
+            st.download_button(
+                label="Скачать изменения как CSV",
+                data=changes.to_csv(index=False, encoding='cp1251'),
+                file_name="snapshot_diff.csv",
+                mime="text/csv"
+            )
+
+            st.subheader(f"Аномалии по затронутым счетчикам: {len(diff.affected_meters())}")
+            st.dataframe(stages["affected_anomalies"], hide_index=True, use_container_width=True)
+
+        debug_panel(snapshot_pipeline)
+    else:
+        st.info("Загрузите обе выгрузки, чтобы сравнить их.")
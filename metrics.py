@@ -0,0 +1,45 @@
+import pandas as pd
+
+# Названия производных колонок удельного потребления
+SPECIFIC_PER_AREA = "Удельное потребление, Гкал/м²"
+SPECIFIC_PER_FLOOR = "Потребление на этаж, Гкал"
+PERCENTILE_PER_AREA = "Перцентиль Гкал/м² в когорте"
+PERCENTILE_PER_FLOOR = "Перцентиль Гкал/этаж в когорте"
+
+# Когорта сравнения: тип и категория здания в пределах одного периода
+COHORT_COLUMNS = ["Тип объекта", "Категория здания", "Год", "Месяц"]
+
+
+def _to_numeric(series):
+    # Числа в выгрузке могут приходить строками с запятой в качестве разделителя
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype("float64")
+    return pd.to_numeric(series.astype(str).str.replace(",", "."), errors="coerce")
+
+
+def add_specific_consumption(df, consumption_col="Текущее потребление, Гкал"):
+    # Удельное потребление на м² и на этаж с перцентилями внутри когорты.
+    # Считается один раз при загрузке, дальше графики и таблицы только сортируют по готовым колонкам.
+    df = df.copy()
+    consumption = _to_numeric(df[consumption_col])
+
+    if "Общая площадь объекта" in df.columns:
+        area = _to_numeric(df["Общая площадь объекта"]).where(lambda s: s > 0)
+        df[SPECIFIC_PER_AREA] = (consumption / area).astype("float32")
+    if "Этажность объекта" in df.columns:
+        floors = _to_numeric(df["Этажность объекта"]).where(lambda s: s > 0)
+        df[SPECIFIC_PER_FLOOR] = (consumption / floors).astype("float32")
+
+    cohort = [col for col in COHORT_COLUMNS if col in df.columns]
+    for value_col, rank_col in [(SPECIFIC_PER_AREA, PERCENTILE_PER_AREA),
+                                (SPECIFIC_PER_FLOOR, PERCENTILE_PER_FLOOR)]:
+        if value_col not in df.columns:
+            continue
+        if cohort:
+            ranks = df.groupby(cohort, dropna=False, observed=True)[value_col].rank(pct=True)
+        else:
+            ranks = df[value_col].rank(pct=True)
+        # Перцентиль 0–100 хранится компактно: UInt8 с поддержкой пропусков
+        df[rank_col] = (ranks * 100).round().astype("UInt8")
+
+    return df
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+# Разбор колонок по уникальным значениям: в выгрузке миллионы строк, но лишь тысячи разных дат,
+# типов и видов ГВС. Каждое уникальное значение разбирается один раз, результат раскладывается
+# обратно по кодам строк; пропуски (код -1) дают пропуск результата.
+
+
+def map_unique(series, func):
+    # func получает pd.Index уникальных значений и возвращает массив той же длины
+    codes, uniques = pd.factorize(series)
+    mapped = pd.Series(func(pd.Index(uniques)))
+    # reindex по кодам: код -1 отсутствует в индексе и дает пропуск нужного типа (NaN, NaT)
+    return pd.Series(mapped.reindex(codes).to_numpy(), index=series.index, name=series.name)
+
+
+def parse_dates(series, **kwargs):
+    kwargs.setdefault("errors", "coerce")
+    return map_unique(series, lambda uniques: pd.to_datetime(uniques, **kwargs))
+
+
+def title_case(series):
+    # Как astype(str).str.strip().str.title(): пропуск становится строкой "Nan"
+    return map_unique(series, lambda uniques: uniques.astype(str).str.strip().str.title()).fillna("Nan")
+
+
+def contains(series, substring):
+    # Булев признак подстроки в строковом представлении значения; пропуски дают False
+    codes, uniques = pd.factorize(series)
+    matches = [substring in str(value) for value in uniques]
+    return pd.Series(np.append(np.asarray(matches, dtype=bool), False)[codes], index=series.index)
@@ -0,0 +1,90 @@
+import hashlib
+import time
+
+import pandas as pd
+import streamlit as st
+
+# Этапы вкладки (загрузка → очистка → объединение → признаки → фильтр) объявляют свои входы.
+# Отпечаток этапа — хэш имени и отпечатков входов, поэтому данные хэшируются только на входе
+# конвейера (файл — по file_id, параметры — по значению). Этап пересчитывается, только если
+# изменился отпечаток, иначе берется результат прошлого запуска из session_state.
+# Результаты общие между запусками: этапы не должны изменять свои входы на месте.
+
+
+def fingerprint(value):
+    file_id = getattr(value, "file_id", None)
+    if file_id is not None:
+        return f"file:{file_id}:{value.size}"
+    if isinstance(value, (list, tuple)) and any(getattr(item, "file_id", None) is not None for item in value):
+        # Несколько загруженных файлов: отпечаток зависит от состава и порядка
+        return "files:[" + ",".join(fingerprint(item) for item in value) + "]"
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return f"frame:{pd.util.hash_pandas_object(value, index=True).sum()}"
+    return f"value:{value!r}"
+
+
+def _digest(*parts):
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+class Pipeline:
+    def __init__(self, name):
+        self.name = name
+        self.stages = {}
+
+    def stage(self, *inputs):
+        # Регистрация этапа; входы — имена источников run() или ранее объявленных этапов
+        def register(func):
+            self.stages[func.__name__] = (func, inputs)
+            return func
+        return register
+
+    def run(self, *targets, **sources):
+        # Вычисляются только запрошенные этапы и их предки (без targets — все этапы).
+        # Повторный run() в том же перезапуске с теми же источниками берет готовое из кэша.
+        memo = st.session_state.setdefault(f"pipeline_{self.name}", {})
+        log = st.session_state.setdefault(f"pipeline_{self.name}_log", {})
+        values = dict(sources)
+        fingerprints = {name: fingerprint(value) for name, value in sources.items()}
+
+        def resolve(name):
+            if name in fingerprints:
+                return
+            if name not in self.stages:
+                raise KeyError(f"Конвейер '{self.name}': нет этапа или источника '{name}'")
+            func, inputs = self.stages[name]
+            for inp in inputs:
+                resolve(inp)
+            key = _digest(name, [fingerprints[inp] for inp in inputs])
+            started = time.perf_counter()
+            cached = memo.get(name)
+            if cached is not None and cached[0] == key:
+                values[name] = cached[1]
+                status = "из кэша"
+            else:
+                values[name] = func(*(values[inp] for inp in inputs))
+                memo[name] = (key, values[name])
+                status = "вычислен"
+            fingerprints[name] = key
+            # Повторное обращение к уже вычисленному в этом перезапуске этапу не затирает его статус
+            if log.get(name, {}).get("Статус") != "вычислен" or status == "вычислен":
+                log[name] = {
+                    "Этап": name,
+                    "Входы": ", ".join(inputs),
+                    "Статус": status,
+                    "Время, мс": round((time.perf_counter() - started) * 1000, 1),
+                }
+
+        for target in targets or list(self.stages):
+            resolve(target)
+        return values
+
+
+def debug_panel(pipeline):
+    # Какие этапы пересчитаны, а какие взяты из кэша на последнем перезапуске. Вызывается в конце
+    # вкладки; журнал очищается, чтобы следующий перезапуск начался с чистого листа
+    log = st.session_state.pop(f"pipeline_{pipeline.name}_log", None)
+    if not log:
+        return
+    with st.expander("🛠️ Этапы обработки (отладка)"):
+        st.dataframe(pd.DataFrame(list(log.values())), use_container_width=True, hide_index=True)
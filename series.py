@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+
+class MeterSeries:
+    # Хранилище показаний по счетчикам: номера ОДПУ закодированы в int32, строки отсортированы
+    # по (счетчик, дата) и лежат в непрерывных массивах NumPy. Строки счетчика i — это
+    # срез [offsets[i], offsets[i + 1]), поэтому история, агрегаты и детальные таблицы
+    # получаются срезами без просмотра всей таблицы.
+    def __init__(self, df, meter_col="№ ОДПУ", date_col=None, columns=None):
+        codes, meters = pd.factorize(df[meter_col], sort=True)
+        codes = codes.astype(np.int32)
+        if date_col is None:
+            order = np.argsort(codes, kind="stable")
+        else:
+            order = np.lexsort((df[date_col].to_numpy(), codes))
+        # Строки без номера ОДПУ (код -1) в хранилище не попадают
+        order = order[codes[order] >= 0]
+
+        self.meter_col = meter_col
+        self.ids = codes[order]
+        self.meters = np.asarray(meters)
+        self.offsets = np.searchsorted(self.ids, np.arange(len(self.meters) + 1)).astype(np.int64)
+        self.positions = {meter: position for position, meter in enumerate(self.meters)}
+        self.columns = {
+            column: df[column].to_numpy()[order]
+            for column in (columns if columns is not None else df.columns)
+        }
+
+    def __len__(self):
+        return len(self.meters)
+
+    def rows(self, meter):
+        position = self.positions[meter]
+        return slice(self.offsets[position], self.offsets[position + 1])
+
+    def values(self, meter, column):
+        return self.columns[column][self.rows(meter)]
+
+    def block(self, meter, columns=None):
+        rows = self.rows(meter)
+        return pd.DataFrame({
+            column: self.columns[column][rows]
+            for column in (columns if columns is not None else self.columns)
+        })
+
+    def aggregate(self, column, ufunc=np.add):
+        # Агрегат по каждому счетчику одним reduceat по границам блоков (пустых блоков не бывает)
+        values = self.columns[column]
+        if len(values) == 0:
+            return pd.Series(dtype="float64")
+        return pd.Series(ufunc.reduceat(values, self.offsets[:-1]), index=self.meters, name=column)
+
+
+def monthly_frame(df, meter_col="№ ОДПУ", date_col="Дата_Показания",
+                  value_cols=("Текущее потребление, Гкал", "Температура")):
+    # Среднемесячные значения сразу для всех счетчиков одним групповым resample;
+    # пропущенные месяцы внутри истории счетчика остаются строками с NaN, как в resample по одному счетчику
+    monthly = (
+        df.groupby(meter_col, sort=True)
+        .resample("ME", on=date_col)[list(value_cols)]
+        .mean()
+        .reset_index()
+    )
+    monthly["Год-Месяц"] = monthly[date_col].dt.strftime("%Y-%m")
+    return monthly
+
+
+def monthly_means(df, meter_col="№ ОДПУ", date_col="Дата_Показания",
+                  value_cols=("Текущее потребление, Гкал", "Температура")):
+    return MeterSeries(monthly_frame(df, meter_col, date_col, value_cols), meter_col, date_col=date_col)
+
+
+class MonthMatrix:
+    # Плотная матрица счетчик × месяц: values — float32 (0 там, где показаний нет), observed — маска
+    # наличия показаний. Строится один раз при загрузке; вопросы по всему парку (пропуски, нули,
+    # сезонность, сравнение с прошлым годом) сводятся к редукциям NumPy по одному непрерывному массиву.
+    def __init__(self, df, meter_col="№ ОДПУ", value_col="Текущее потребление, Гкал", year_col="Год",
+                 month_col="Месяц"):
+        codes, meters = pd.factorize(df[meter_col], sort=True)
+        year = pd.to_numeric(df[year_col], errors="coerce").to_numpy(dtype="float64")
+        month = pd.to_numeric(df[month_col], errors="coerce").to_numpy(dtype="float64")
+        value = pd.to_numeric(df[value_col], errors="coerce").to_numpy(dtype="float64")
+        valid = (codes >= 0) & ~np.isnan(year) & (month >= 1) & (month <= 12) & ~np.isnan(value)
+
+        month_index = (year[valid] * 12 + month[valid] - 1).astype(np.int64)
+        first = month_index.min() if len(month_index) else 0
+        n_months = int(month_index.max() - first + 1) if len(month_index) else 0
+        self.meters = np.asarray(meters)
+        periods = first + np.arange(n_months)
+        self.years = (periods // 12).astype(np.int32)
+        self.months = (periods % 12 + 1).astype(np.int8)
+
+        # Несколько показаний счетчика за один месяц суммируются
+        cells = codes[valid].astype(np.int64) * n_months + (month_index - first)
+        size = len(self.meters) * n_months
+        shape = (len(self.meters), n_months)
+        self.values = np.bincount(cells, weights=value[valid], minlength=size).astype(np.float32).reshape(shape)
+        self.observed = np.bincount(cells, minlength=size).astype(bool).reshape(shape)
+
+    def coverage(self):
+        # Доля счетчиков с показанием в каждом месяце
+        return self.observed.mean(axis=0)
+
+    def totals(self):
+        return self.values.sum(axis=0, dtype=np.float64)
+
+    def zero_share(self):
+        zeros = (self.observed & (self.values == 0)).sum(axis=0)
+        return zeros / np.maximum(self.observed.sum(axis=0), 1)
+
+    def longest_zero_run(self):
+        # Самая длинная серия месяцев подряд с нулевым показанием у каждого счетчика:
+        # накопленная сумма нулей минус ее значение на последнем ненулевом месяце
+        zeros = (self.observed & (self.values == 0)).astype(np.int32)
+        running = np.cumsum(zeros, axis=1)
+        reset = np.maximum.accumulate(np.where(zeros == 0, running, 0), axis=1)
+        run = running - reset
+        return run.max(axis=1) if run.shape[1] else np.zeros(len(self.meters), dtype=np.int32)
+
+    def year_over_year(self):
+        # Отношение к тому же месяцу прошлого года (колонки со сдвигом 12); NaN без пары показаний
+        current, previous = self.values[:, 12:], self.values[:, :-12]
+        paired = self.observed[:, 12:] & self.observed[:, :-12] & (previous > 0)
+        ratio = np.full(current.shape, np.nan, dtype=np.float32)
+        np.divide(current, previous, out=ratio, where=paired)
+        return ratio
+
+    def calendar(self, per_month):
+        # Раскладка помесячного показателя в таблицу Год × Месяц для календарной тепловой карты
+        return (
+            pd.DataFrame({"Год": self.years, "Месяц": self.months, "value": per_month})
+            .pivot(index="Год", columns="Месяц", values="value")
+            .reindex(columns=range(1, 13))
+        )
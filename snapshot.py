@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+from anomalies import METER, RuleSet
+from dedup import row_hashes
+
+# Сравнение двух выгрузок одного периода (исходной и исправленной). Показания сопоставляются
+# по ключу (№ ОДПУ, дата показания): ключ каждой строки сворачивается в 64-битный хэш, и соединение
+# идет по отсортированным массивам хэшей, без сравнения строк и дат и без merge исходных таблиц.
+
+DIFF_KEYS = ["№ ОДПУ", "Дата текущего показания"]
+CONSUMPTION = "Текущее потребление, Гкал"
+ADDED = "Добавлено"
+REMOVED = "Удалено"
+CHANGED = "Изменено"
+BEFORE = "Было, Гкал"
+AFTER = "Стало, Гкал"
+DELTA = "Разница, Гкал"
+
+
+def _unique_keys(df, keys):
+    # Отсортированные уникальные хэши ключей и позиция первой строки с каждым ключом
+    return np.unique(row_hashes(df, keys), return_index=True)
+
+
+def _values(df, col):
+    return pd.to_numeric(df[col], errors="coerce").to_numpy(dtype="float64")
+
+
+class SnapshotDiff:
+    # Добавленные, удаленные и измененные показания; при повторе ключа внутри выгрузки
+    # сравнивается первая строка с этим ключом
+    def __init__(self, old, new, value_col=CONSUMPTION, keys=DIFF_KEYS, extra=("Адрес объекта",)):
+        old_hashes, old_rows = _unique_keys(old, keys)
+        new_hashes, new_rows = _unique_keys(new, keys)
+        common, old_common, new_common = np.intersect1d(
+            old_hashes, new_hashes, assume_unique=True, return_indices=True
+        )
+        removed = np.ones(len(old_hashes), dtype=bool)
+        removed[old_common] = False
+        added = np.ones(len(new_hashes), dtype=bool)
+        added[new_common] = False
+
+        # Измененные: значение отличается, причем пропуск и пропуск считаются равными
+        old_values = _values(old, value_col)[old_rows[old_common]]
+        new_values = _values(new, value_col)[new_rows[new_common]]
+        changed = ~((old_values == new_values) | (np.isnan(old_values) & np.isnan(new_values)))
+
+        columns = list(keys) + [col for col in extra if col in old.columns and col in new.columns]
+        parts = [
+            (new, new_rows[added], ADDED, np.full(int(added.sum()), np.nan), _values(new, value_col)[new_rows[added]]),
+            (old, old_rows[removed], REMOVED, _values(old, value_col)[old_rows[removed]], np.full(int(removed.sum()), np.nan)),
+            (new, new_rows[new_common][changed], CHANGED, old_values[changed], new_values[changed]),
+        ]
+        frames = []
+        for source, rows, kind, before, after in parts:
+            frame = source.iloc[rows][columns].reset_index(drop=True)
+            frame.insert(0, "Изменение", kind)
+            frame[BEFORE] = before
+            frame[AFTER] = after
+            frames.append(frame)
+        self.changes = pd.concat(frames, ignore_index=True)
+        self.changes[DELTA] = (np.nan_to_num(self.changes[AFTER].to_numpy()) - np.nan_to_num(self.changes[BEFORE].to_numpy())).round(3)
+        self.unchanged = len(common) - int(changed.sum())
+
+    def counts(self):
+        counts = self.changes["Изменение"].value_counts()
+        return {kind: int(counts.get(kind, 0)) for kind in (ADDED, REMOVED, CHANGED)}
+
+    def affected_meters(self):
+        # Показания без номера ОДПУ ни к какому счетчику не относятся
+        meters = self.changes[METER].dropna()
+        return pd.unique(meters.astype(str).str.strip())
+
+
+def anomaly_changes(old, new, meters, rules):
+    # Правила аномалий пересчитываются только по затронутым счетчикам, в обеих выгрузках.
+    # Подходят правила, зависящие лишь от истории самого счетчика (не от средних по всей выборке)
+    counts = []
+    for label, df in (("было", old), ("стало", new)):
+        subset = df[df[METER].notna() & df[METER].astype(str).str.strip().isin(meters)]
+        flags = RuleSet(rules).evaluate(subset)
+        flags[METER] = subset[METER].astype(str).str.strip().to_numpy()
+        counts.append(flags.groupby(METER).sum().add_suffix(f" ({label})"))
+    result = pd.concat(counts, axis=1).reindex(pd.Index(meters, name=METER)).fillna(0).astype(int)
+    return result[sorted(result.columns, key=lambda col: col.rsplit(" (", 1)[0])].reset_index()
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+PAGE_SIZE = 100
+
+
+def _sort_order(column, ascending):
+    # Ранги значений через factorize(sort=True): сортируются только уникальные значения,
+    # строки упорядочиваются по целочисленным кодам. Пропуски всегда в конце.
+    codes, _ = pd.factorize(column, sort=True)
+    codes = codes.astype(np.int64)
+    if not ascending:
+        codes = np.where(codes >= 0, codes.max() - codes, codes)
+    codes[codes < 0] = np.iinfo(np.int64).max
+    return np.argsort(codes, kind="stable")
+
+
+def _filter_mask(column, query):
+    # Подстрока ищется среди уникальных значений колонки, результат раскладывается по кодам строк
+    codes, uniques = pd.factorize(column)
+    matches = pd.Index(uniques).astype(str).str.contains(query, case=False, regex=False)
+    return np.append(np.asarray(matches), False)[codes]
+
+
+def _styled_page(page_df, page_styles):
+    # CSS строк уже посчитан векторно для всей таблицы; Styler получает только страницу,
+    # поэтому ограничение styler.render.max_elements не достигается
+    if not page_df.index.is_unique:
+        page_df = page_df.reset_index(drop=True)
+    styles = pd.DataFrame(
+        np.repeat(np.asarray(page_styles, dtype=object)[:, None], page_df.shape[1], axis=1),
+        index=page_df.index,
+        columns=page_df.columns,
+    )
+    return page_df.style.apply(lambda _: styles, axis=None)
+
+
+def paged_table(df, key, page_size=PAGE_SIZE, row_styles=None):
+    # Постраничная таблица: сортировка и фильтр выполняются на сервере над позициями строк,
+    # в браузер уходит только текущая страница. row_styles — CSS для каждой строки df ('' — без стиля)
+    col_sort, col_order, col_filter, col_query = st.columns([3, 1, 3, 3])
+    with col_sort:
+        sort_column = st.selectbox("Сортировка", [None] + list(df.columns), key=f"{key}_sort")
+    with col_order:
+        ascending = st.toggle("По возрастанию", value=True, key=f"{key}_ascending")
+    with col_filter:
+        filter_column = st.selectbox("Фильтр по колонке", [None] + list(df.columns), key=f"{key}_filter")
+    with col_query:
+        query = st.text_input("Содержит", key=f"{key}_query", disabled=filter_column is None)
+
+    positions = np.arange(len(df))
+    if sort_column is not None:
+        positions = _sort_order(df[sort_column], ascending)
+    if filter_column is not None and query:
+        positions = positions[_filter_mask(df[filter_column], query)[positions]]
+
+    pages = max((len(positions) - 1) // page_size + 1, 1)
+    # После фильтрации страниц может стать меньше, чем номер текущей
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages
+    page = st.number_input("Страница", min_value=1, max_value=pages, key=f"{key}_page")
+    start = (page - 1) * page_size
+    page_positions = positions[start:start + page_size]
+    st.caption(
+        f"Страница {page} из {pages}: строки {start + 1 if len(page_positions) else 0}–"
+        f"{start + len(page_positions)} из {len(positions)}"
+    )
+
+    page_df = df.iloc[page_positions]
+    if row_styles is None:
+        st.dataframe(page_df, use_container_width=True)
+    else:
+        st.dataframe(_styled_page(page_df, np.asarray(row_styles)[page_positions]), use_container_width=True)
+    return page_df
+
+
+def quality_panel(report):
+    # Сводка нарушений по правилам для текущей выгрузки
+    summary = report.summary()
+    violated = int((summary["Нарушений"] > 0).sum())
+    with st.expander(f"🩺 Качество данных: нарушено правил — {violated} из {len(summary)}"):
+        st.dataframe(summary, hide_index=True, use_container_width=True)
@@ -0,0 +1,179 @@
+import argparse
+import json
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+
+from anomalies import RuleSet, ZERO_IN_HEATING
+from geo import ICON_MIN_ZOOM, cell_size_degrees, grid_aggregate
+from parsing import title_case
+
+# Пирамида тайлов слоя объектов для общегородской карты: static/tiles/{z}/{x}/{y}.json.
+# Streamlit раздает папку static при server.enableStaticServing (см. .streamlit/config.toml),
+# в приложении тайлы доступны по адресу app/static/tiles/{z}/{x}/{y}.json.
+TILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "tiles")
+TILES_URL = "app/static/tiles/{z}/{x}/{y}.json"
+META_PATH = os.path.join(TILES_DIR, "meta.json")
+
+
+def tile_xy(lat, lon, zoom):
+    # Номера тайлов Web Mercator (схема XYZ) для массивов координат
+    n = 2 ** zoom
+    lat_rad = np.radians(np.clip(lat, -85.0511, 85.0511))
+    x = np.floor((lon + 180.0) / 360.0 * n).astype(np.int64)
+    y = np.floor((1.0 - np.arcsinh(np.tan(lat_rad)) / np.pi) / 2.0 * n).astype(np.int64)
+    return np.clip(x, 0, n - 1), np.clip(y, 0, n - 1)
+
+
+def latest_objects(df):
+    # Одна запись на объект: последнее показание, признак нулевого потребления в отопительный период
+    # в последнем месяце и число таких месяцев за всю историю
+    key = "№ ОДПУ" if "№ ОДПУ" in df.columns else "Упрощенный адрес"
+    df = df.dropna(subset=["Широта", "Долгота"]).copy()
+    df["Тип объекта"] = title_case(df["Тип объекта"])
+    df["zero"] = RuleSet([ZERO_IN_HEATING]).evaluate(df)[ZERO_IN_HEATING.name]
+    zero_months = df.groupby(key)["zero"].sum()
+    latest = df.sort_values(["Год", "Месяц"]).drop_duplicates(subset=[key], keep="last").set_index(key)
+    latest["zero_months"] = zero_months.reindex(latest.index).fillna(0).astype(int)
+    return latest.reset_index()
+
+
+def _point_features(objects):
+    return [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [round(lon, 5), round(lat, 5)]},
+            "properties": {"n": address, "t": obj_type, "c": None if pd.isna(value) else round(float(value), 3),
+                           "a": int(zero), "m": int(months)},
+        }
+        for lat, lon, address, obj_type, value, zero, months in zip(
+            objects["Широта"], objects["Долгота"], objects["Упрощенный адрес"], objects["Тип объекта"],
+            objects["Текущее потребление, Гкал"], objects["zero"], objects["zero_months"]
+        )
+    ]
+
+
+def _cell_features(cells):
+    return [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [round(lon, 5), round(lat, 5)]},
+            "properties": {"n": f"Объектов: {count}", "t": "Группа объектов", "c": round(float(total), 3),
+                           "a": round(anomalies / count, 3), "m": int(anomalies), "k": int(count)},
+        }
+        for lat, lon, count, total, anomalies in zip(
+            cells["lat"], cells["lon"], cells["Объектов"], cells["Гкал"], cells["Аномалий"]
+        )
+    ]
+
+
+def _clear_tiles(out_dir):
+    # Удаляется только прежняя пирамида: каталоги уровней {z} и meta.json. Непустой каталог без meta.json —
+    # не каталог тайлов (например, static или корень проекта), его содержимое не трогаем
+    if not os.path.isdir(out_dir):
+        return
+    entries = os.listdir(out_dir)
+    if entries and "meta.json" not in entries:
+        raise ValueError(f"Каталог {out_dir} не пуст и не содержит meta.json — это не каталог тайлов")
+    for entry in entries:
+        path = os.path.join(out_dir, entry)
+        if entry.isdigit() and os.path.isdir(path):
+            shutil.rmtree(path)
+    if "meta.json" in entries:
+        os.remove(os.path.join(out_dir, "meta.json"))
+
+
+def build_tiles(objects, min_zoom=9, max_zoom=16, out_dir=TILES_DIR):
+    # На мелких масштабах в тайл попадают ячейки сетки (как в агрегированном режиме карты),
+    # начиная с ICON_MIN_ZOOM — отдельные объекты. Размер тайла не растет с размером парка.
+    _clear_tiles(out_dir)
+    lat = objects["Широта"].to_numpy(dtype="float64")
+    lon = objects["Долгота"].to_numpy(dtype="float64")
+    written = 0
+    for zoom in range(min_zoom, max_zoom + 1):
+        x, y = tile_xy(lat, lon, zoom)
+        order = np.lexsort((y, x))
+        tile_keys = x[order] * 2 ** zoom + y[order]
+        bounds = np.flatnonzero(np.diff(tile_keys)) + 1
+        for rows in np.split(order, bounds):
+            if len(rows) == 0:
+                continue
+            tile_objects = objects.iloc[rows]
+            if zoom >= ICON_MIN_ZOOM:
+                features = _point_features(tile_objects)
+            else:
+                cells = grid_aggregate(
+                    tile_objects["Широта"], tile_objects["Долгота"], cell_size_degrees(zoom),
+                    values=tile_objects["Текущее потребление, Гкал"], flags=tile_objects["zero"],
+                )
+                features = _cell_features(cells)
+            tile_dir = os.path.join(out_dir, str(zoom), str(x[rows[0]]))
+            os.makedirs(tile_dir, exist_ok=True)
+            with open(os.path.join(tile_dir, f"{y[rows[0]]}.json"), "w", encoding="utf-8") as tile_file:
+                json.dump({"type": "FeatureCollection", "features": features}, tile_file,
+                          ensure_ascii=False, separators=(",", ":"))
+            written += 1
+
+    meta = {
+        "generated": datetime.now().isoformat(timespec="seconds"),
+        "objects": int(len(objects)),
+        "tiles": written,
+        "min_zoom": min_zoom,
+        "max_zoom": max_zoom,
+        "center": [float(np.nanmean(lat)), float(np.nanmean(lon))],
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as meta_file:
+        json.dump(meta, meta_file, ensure_ascii=False, indent=2)
+    return meta
+
+
+def tiles_layer(meta):
+    # Слой готовых тайлов: цвет от доли аномалий (у отдельного объекта 0 или 1), группы крупнее объектов
+    return pdk.Layer(
+        "TileLayer",
+        TILES_URL,
+        id="tiles",
+        min_zoom=meta["min_zoom"],
+        max_zoom=meta["max_zoom"],
+        get_fill_color="[40 + 200 * properties.a, 170 * (1 - properties.a), 60, 200]",
+        get_line_color=[51, 51, 51],
+        point_radius_units="'pixels'",
+        get_point_radius="properties.k ? 10 : 5",
+        line_width_min_pixels=1,
+        pickable=True,
+    )
+
+
+TILES_TOOLTIP = {
+    "html": "<b>{n}</b><br>Тип: {t}<br>Потребление: {c} Гкал<br>Месяцев с нулевым потреблением в ОП: {m}",
+    "style": {"backgroundColor": "white", "color": "black"},
+}
+
+
+def load_meta(path=META_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as meta_file:
+        return json.load(meta_file)
+
+
+if __name__ == "__main__":
+    # Ночная пересборка тайлов, например из cron: python tiles.py выгрузка.csv
+    parser = argparse.ArgumentParser(description="Генерация тайлов слоя объектов теплопотребления")
+    parser.add_argument("source", help="CSV-выгрузка в кодировке cp1251, как для вкладки map.py")
+    parser.add_argument("--min-zoom", type=int, default=9)
+    parser.add_argument("--max-zoom", type=int, default=16)
+    parser.add_argument("--out", default=TILES_DIR)
+    args = parser.parse_args()
+
+    source_df = pd.read_csv(args.source, encoding="cp1251", sep=",")
+    source_df["Упрощенный адрес"] = source_df["Упрощенный адрес"].fillna("Неизвестный адрес")
+    try:
+        result = build_tiles(latest_objects(source_df), args.min_zoom, args.max_zoom, args.out)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Объектов: {result['objects']}, тайлов: {result['tiles']} -> {args.out}")
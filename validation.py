@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+from parsing import contains, map_unique, parse_dates
+
+# Названия правил; по ним вкладки берут готовые маски нарушений
+COMMA_IN_METER = "Запятая в № ОДПУ"
+NO_READING_DATE = "Нет даты текущего показания"
+NO_FLOORS = "Нет этажности"
+NO_AREA = "Нет общей площади"
+NO_BUILD_DATE = "Нет даты постройки"
+NO_PERIOD = "Нет года или месяца"
+NO_CONSUMPTION = "Нет потребления"
+NEGATIVE_CONSUMPTION = "Отрицательное потребление"
+BAD_COORDINATES = "Координаты вне допустимого диапазона"
+
+
+class _Columns:
+    # Общие промежуточные результаты одного прохода: каждая колонка разбирается не больше одного раза,
+    # строковые проверки выполняются по уникальным значениям и раскладываются по кодам строк
+    def __init__(self, df):
+        self.df = df
+        self._numeric = {}
+
+    def numeric(self, col):
+        if col not in self._numeric:
+            series = self.df[col]
+            if pd.api.types.is_numeric_dtype(series):
+                values = series.to_numpy(dtype="float64", na_value=np.nan)
+            else:
+                values = map_unique(
+                    series, lambda uniques: pd.to_numeric(uniques.astype(str).str.replace(",", "."), errors="coerce")
+                ).to_numpy(dtype="float64", na_value=np.nan)
+            self._numeric[col] = values
+        return self._numeric[col]
+
+    def missing(self, col):
+        return self.df[col].isna().to_numpy()
+
+    def contains(self, col, substring):
+        return contains(self.df[col], substring).to_numpy()
+
+    def unparsable_date(self, col):
+        return parse_dates(self.df[col]).isna().to_numpy()
+
+
+# Правило: (название, нужные колонки, функция маски нарушений над общими промежуточными результатами)
+RULES = [
+    (COMMA_IN_METER, ["№ ОДПУ"], lambda c: c.contains("№ ОДПУ", ",")),
+    (NO_READING_DATE, ["Дата текущего показания"], lambda c: c.missing("Дата текущего показания")),
+    (NO_FLOORS, ["Этажность объекта"], lambda c: np.isnan(c.numeric("Этажность объекта"))),
+    (NO_AREA, ["Общая площадь объекта"], lambda c: np.isnan(c.numeric("Общая площадь объекта"))),
+    (NO_BUILD_DATE, ["Дата постройки"], lambda c: c.unparsable_date("Дата постройки")),
+    (NO_PERIOD, ["Год", "Месяц"], lambda c: np.isnan(c.numeric("Год")) | np.isnan(c.numeric("Месяц"))),
+    (NO_CONSUMPTION, ["Текущее потребление, Гкал"], lambda c: np.isnan(c.numeric("Текущее потребление, Гкал"))),
+    (NEGATIVE_CONSUMPTION, ["Текущее потребление, Гкал"], lambda c: c.numeric("Текущее потребление, Гкал") < 0),
+    (BAD_COORDINATES, ["Широта", "Долгота"], lambda c: (
+        (np.abs(c.numeric("Широта")) > 90) | (np.abs(c.numeric("Долгота")) > 180)
+        | ((c.numeric("Широта") == 0) & (c.numeric("Долгота") == 0))
+    )),
+]
+
+
+class ValidationReport:
+    # Результат проверки: маска нарушений по каждому правилу, применимому к колонкам выгрузки
+    def __init__(self, df, rules=RULES):
+        columns = _Columns(df)
+        self.rows = len(df)
+        self.masks = {
+            name: np.asarray(check(columns), dtype=bool)
+            for name, required, check in rules
+            if all(col in df.columns for col in required)
+        }
+
+    def violations(self, *names):
+        # Строки, нарушающие хотя бы одно из правил (неприменимые правила пропускаются)
+        mask = np.zeros(self.rows, dtype=bool)
+        for name in names:
+            if name in self.masks:
+                mask |= self.masks[name]
+        return mask
+
+    def summary(self):
+        counts = [int(mask.sum()) for mask in self.masks.values()]
+        return pd.DataFrame({
+            "Правило": list(self.masks),
+            "Нарушений": counts,
+            "Доля строк": [round(count / max(self.rows, 1), 4) for count in counts],
+        })
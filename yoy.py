@@ -0,0 +1,57 @@
+import pandas as pd
+
+PREVIOUS_SUFFIX = " год назад"
+CHANGE_COL = "Изменение к прошлому году, %"
+
+
+def _change(current, previous):
+    # Процент изменения; при нулевом прошлогоднем значении изменение не определено
+    return ((current / previous.where(previous != 0) - 1) * 100).round(1)
+
+
+def yoy_pairs(df, meter_col="№ ОДПУ", value_col="Текущее потребление, Гкал",
+              attributes=("Район", "Тип объекта")):
+    # Потребление счетчика за месяц рядом с тем же месяцем прошлого года: месячные суммы
+    # соединяются сами с собой по (счетчик, месяц) со сдвигом года на единицу
+    attributes = [col for col in attributes if col in df.columns]
+    monthly = (
+        df.assign(**{
+            value_col: pd.to_numeric(df[value_col], errors="coerce"),
+            "Год": pd.to_numeric(df["Год"], errors="coerce"),
+            "Месяц": pd.to_numeric(df["Месяц"], errors="coerce"),
+        })
+        .groupby([meter_col, "Год", "Месяц"], as_index=False, sort=False)
+        .agg(**{value_col: (value_col, "sum")}, **{col: (col, "first") for col in attributes})
+    )
+    previous = monthly[[meter_col, "Год", "Месяц", value_col]].assign(Год=monthly["Год"] + 1)
+    pairs = monthly.merge(previous, on=[meter_col, "Год", "Месяц"], how="inner", suffixes=("", PREVIOUS_SUFFIX))
+    pairs[CHANGE_COL] = _change(pairs[value_col], pairs[value_col + PREVIOUS_SUFFIX])
+    return pairs
+
+
+def yoy_rollup(pairs, by, value_col="Текущее потребление, Гкал"):
+    # Сравнение «как с подобным» по группам: суммы только по счетчикам, у которых есть оба года
+    rollup = (
+        pairs.groupby(list(by) + ["Год", "Месяц"], as_index=False)
+        .agg(**{
+            "Счетчиков": (value_col, "size"),
+            value_col: (value_col, "sum"),
+            value_col + PREVIOUS_SUFFIX: (value_col + PREVIOUS_SUFFIX, "sum"),
+        })
+    )
+    rollup[CHANGE_COL] = _change(rollup[value_col], rollup[value_col + PREVIOUS_SUFFIX])
+    return rollup
+
+
+def yoy_tables(df, meter_col="№ ОДПУ", value_col="Текущее потребление, Гкал"):
+    # Все представления сравнения с прошлым годом разом — для кэширования на весь набор данных
+    pairs = yoy_pairs(df, meter_col=meter_col, value_col=value_col)
+    rollups = {
+        col: yoy_rollup(pairs, [col], value_col=value_col)
+        for col in ("Район", "Тип объекта") if col in pairs.columns
+    }
+    return pairs, rollups
+
+
+def period_slice(table, year, month):
+    return table[(table["Год"] == year) & (table["Месяц"] == month)]